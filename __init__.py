@@ -1,12 +1,31 @@
-from .framerate_limiter import FramerateLimiter
-from .entity_group import EntityGroup
-from .level import load_level
-from .resources import Resources
-from .utils import run_simple_main_loop, Ref
-from .ui import Label, ColorRect, CircleScroller
-
-del framerate_limiter
-del resources
-del entity_group
-del utils
-del level
\ No newline at end of file
+import importlib
+
+# {name: submodule}, imported when the name is first used, so that importing
+# dalgi does not import sdl2 or the TOML parser
+_LAZY = {
+    "FramerateLimiter": "framerate_limiter",
+    "FrameProfiler": "profiler",
+    "EntityGroup": "entity_group",
+    "load_level": "level",
+    "Resources": "resources",
+    "run_simple_main_loop": "utils",
+    "run_fixed_step_main_loop": "utils",
+    "run_async_main_loop": "utils",
+    "Ref": "utils",
+    "Label": "ui",
+    "ColorRect": "ui",
+    "CircleScroller": "ui",
+}
+
+__all__ = list(_LAZY)
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module("." + module, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
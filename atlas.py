@@ -0,0 +1,54 @@
+from typing import List, Tuple
+
+Size = Tuple[int, int]
+Placement = Tuple[int, int, int] # (page, x, y)
+
+class ShelfPacker:
+    """Packs rectangles into square pages, by placing them left to right on
+    horizontal shelves. Rectangles are packed tallest first, and each one is
+    put on the first shelf that it fits on, so short rectangles fill the gaps
+    left by tall ones."""
+    def __init__(self, page_size: int = 2048, padding: int = 1):
+        self.page_size = page_size
+        self.padding = padding
+        self.pages = [] # [[shelf y, shelf height, used width]] per page
+
+    def _place(self, width: int, height: int) -> Placement:
+        padded_width = width + self.padding
+        for page, shelves in enumerate(self.pages):
+            for shelf in shelves:
+                y, shelf_height, used = shelf
+                if height <= shelf_height and used + padded_width <= self.page_size:
+                    shelf[2] += padded_width
+                    return (page, used, y)
+            # Open a new shelf below the last one
+            y = shelves[-1][0] + shelves[-1][1] + self.padding if shelves else 0
+            if y + height <= self.page_size:
+                shelves.append([y, height, padded_width])
+                return (page, 0, y)
+
+        self.pages.append([[0, height, padded_width]])
+        return (len(self.pages) - 1, 0, 0)
+
+    def pack(self, sizes: List[Size]) -> List[Placement]:
+        """Returns the (page, x, y) of each of the given (width, height)
+        sizes, in the order they were given."""
+        for width, height in sizes:
+            if width > self.page_size or height > self.page_size:
+                raise ValueError("{}x{} does not fit in a {} pixel atlas page".format(
+                    width, height, self.page_size
+                ))
+        order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+        placements = [None] * len(sizes)
+        for i in order:
+            placements[i] = self._place(*sizes[i])
+        return placements
+
+    def page_sizes(self) -> List[Size]:
+        """Returns the smallest size that each page can be cropped to."""
+        sizes = []
+        for shelves in self.pages:
+            width = max(used for _, _, used in shelves) - self.padding
+            height = shelves[-1][0] + shelves[-1][1]
+            sizes.append((width, height))
+        return sizes
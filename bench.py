@@ -0,0 +1,598 @@
+"""Benchmarks for dalgi, which run without a display.
+Run with 'python -m dalgi.bench' from the directory containing the package.
+'--json PATH' saves the scenario results, and '--compare PATH' compares
+them with results saved earlier, such as from another commit."""
+import argparse
+from collections import deque
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from sdl2.events import MouseMotion, MouseWheel, MouseButtonDown, KeyDown
+from dalgi.entity_group import EntityGroup, LISTENERS
+from dalgi.headless import HeadlessRenderer, HeadlessFont
+from dalgi.level import load_level
+from dalgi.parallel import ParallelUpdater
+from dalgi.resources import Resources
+from dalgi.scheduler import FrameScheduler
+from dalgi import snapshot
+from dalgi.ui import Label
+
+class ScanningEntityGroup(EntityGroup):
+    """An entity group which removes entities by scanning every list, the
+    way entity groups did before keeping membership records."""
+    def _remove_entities(self, removed):
+        for entity in removed:
+            record = self._entities.pop(entity)
+            if record.mask:
+                self._set_mask(entity, record, 0)
+
+            for layer in self._layers:
+                drawables = self._drawables[layer]
+                for i, ent in enumerate(drawables):
+                    if ent is entity:
+                        del drawables[i]
+                        break
+
+            for category in LISTENERS:
+                listeners = self._listeners[category]
+                for i, ent in enumerate(listeners):
+                    if ent is entity:
+                        del listeners[i]
+                        break
+
+            self.messages.disconnect(entity)
+
+class Bullet:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def update(self, delta_time):
+        self.y += delta_time
+
+    def mouse_moved(self, sx, sy, x, y, dx, dy):
+        pass
+
+    def draw(self, renderer, ox, oy):
+        pass
+
+def bench_spawn_despawn(group_class, live=20000, churn=100000, per_frame=100):
+    """Keeps 'live' entities in an initialized group while spawning and
+    removing 'per_frame' entities each frame, until 'churn' entities have
+    been replaced. Returns the number of entities spawned and removed per
+    second."""
+    group = group_class()
+    alive = [Bullet(i, 0) for i in range(live)]
+    for entity in alive:
+        group.add(entity)
+    group.init()
+
+    start = time.perf_counter()
+    for i in range(churn):
+        entity = Bullet(i, 0)
+        group.add(entity)
+        group.add_tags(entity, "bullet")
+        # Remove an older entity, so that removals hit the middle of lists
+        group.remove(alive[i % live])
+        alive[i % live] = entity
+        if i % per_frame == 0:
+            group.commit()
+    group.commit()
+    elapsed = time.perf_counter() - start
+    return churn / elapsed
+
+def bench_tag_query(compiled, entities=5000, queries=2000):
+    """Runs the query 'enemy AND visible AND NOT stunned' while a few
+    entities change tags between runs, and returns the queries per second
+    and the total number of matches, which is the same for both ways.
+    Without compiling, the query intersects the sets of single tags."""
+    group = EntityGroup()
+    bullets = [Bullet(i, 0) for i in range(entities)]
+    group.add_many(bullets)
+    for i, bullet in enumerate(bullets):
+        tags = [tag for tag, n in (("enemy", 2), ("visible", 3), ("stunned", 5)) if i % n == 0]
+        if tags:
+            group.add_tags(bullet, *tags)
+    query = group.query("enemy", "visible", exclude=("stunned",))
+    matched = 0
+    start = time.perf_counter()
+    for i in range(queries):
+        bullet = bullets[i % entities]
+        if i % 2:
+            group.add_tags(bullet, "stunned")
+        else:
+            group.remove_tags(bullet, "stunned")
+        if compiled:
+            matched += len(query)
+        else:
+            matches = (set(group.find_all_with_tag("enemy"))
+                & set(group.find_all_with_tag("visible")))
+            matches -= set(group.find_all_with_tag("stunned"))
+            matched += len(matches)
+    return queries / (time.perf_counter() - start), matched
+
+def recorded_event(cls, **attributes):
+    """Recreates an event from its recorded attributes."""
+    event = cls.__new__(cls)
+    event.__dict__.update(attributes)
+    return event
+
+def mouse_flood_events(frames=60, motions_per_frame=500):
+    """Returns the events of each frame of a high polling rate mouse being
+    moved and scrolled, with the occasional click and key press."""
+    recording = []
+    for frame in range(frames):
+        events = []
+        for i in range(motions_per_frame):
+            events.append(recorded_event(MouseMotion, x=i % 800, y=frame, xrel=1, yrel=0))
+            if i % 50 == 0:
+                events.append(recorded_event(MouseWheel, x=0, y=1, direction=0))
+        events.append(recorded_event(MouseButtonDown, x=10, y=10, button=1))
+        events.append(recorded_event(KeyDown, repeat=False))
+        recording.append(events)
+    return recording
+
+class Pointer:
+    def mouse_moved(self, sx, sy, x, y, dx, dy):
+        pass
+
+    def mouse_scrolled(self, dx, dy, direction):
+        pass
+
+    def mouse_pressed(self, sx, sy, x, y, button, is_touch):
+        pass
+
+    def key_pressed(self, event):
+        pass
+
+def bench_event_replay(coalesce, listeners=1000):
+    """Replays a recorded mouse flood to 'listeners' entities, and returns
+    the number of recorded events handled per second."""
+    group = EntityGroup()
+    group.add_many([Pointer() for _ in range(listeners)])
+    group.init()
+    recording = mouse_flood_events()
+    count = sum(len(events) for events in recording)
+    start = time.perf_counter()
+    for events in recording:
+        group.handle_events(events, coalesce)
+    return count / (time.perf_counter() - start)
+
+class Sprite:
+    def __init__(self, x, y, resources):
+        self.x = x
+        self.y = y
+        self.draw_sprite = resources.draw_function("bench/sprite")
+
+    def update(self, delta_time):
+        self.x += delta_time
+
+    def draw(self, renderer, ox, oy):
+        self.draw_sprite(self.x + ox, self.y + oy)
+
+snapshot.register(Sprite, save=lambda s: (s.x, s.y),
+    restore=lambda state, resources: Sprite(state[0], state[1], resources))
+
+class PooledSprite(Sprite):
+    def reset(self, x, y):
+        self.x = x
+        self.y = y
+
+def sprite_resources(renderer):
+    resources = Resources(renderer)
+    resources.declare_sprite("bench/sprite", "sprite.png", None)
+    return resources
+
+def run_frames(group, renderer, frames, before_frame=None):
+    """Runs and renders frames of the group, and returns the frames per
+    second, the bytes allocated and freed again within each frame, and the
+    memory blocks left allocated by each frame.
+    'before_frame(i)' is called at the beginning of each frame."""
+    def frame(i):
+        if before_frame is not None:
+            before_frame(i)
+        group.update(1 / 60)
+        renderer.clear()
+        group.draw(renderer)
+        renderer.present()
+
+    blocks = sys.getallocatedblocks()
+    start = time.perf_counter()
+    for i in range(frames):
+        frame(i)
+    elapsed = time.perf_counter() - start
+    blocks = sys.getallocatedblocks() - blocks
+
+    # Tracing slows the frames down, so it gets a separate run
+    traced_frames = min(frames, 20)
+    transient = 0
+    tracemalloc.start()
+    for i in range(frames, frames + traced_frames):
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        frame(i)
+        transient += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return {
+        "fps": frames / elapsed,
+        "alloc_bytes_per_frame": transient / traced_frames,
+        "net_blocks_per_frame": blocks / frames,
+        "draw_commands_per_frame": renderer.commands_per_frame,
+    }
+
+def scenario_sprites(count=10000, frames=120):
+    renderer = HeadlessRenderer()
+    resources = sprite_resources(renderer)
+    group = EntityGroup()
+    group.add_many([Sprite(i % 800, i // 800, resources) for i in range(count)])
+    group.init()
+    return run_frames(group, renderer, frames)
+
+def scenario_component_sprites(count=10000, frames=120):
+    renderer = HeadlessRenderer()
+    resources = sprite_resources(renderer)
+    group = EntityGroup()
+    store = group.create_component_store(count, [resources.draw_function("bench/sprite")])
+    for i in range(count):
+        store.spawn(i % 800, i // 800, vx=1.0)
+    group.init()
+    return run_frames(group, renderer, frames)
+
+def scenario_spawn_despawn(live=5000, per_frame=500, frames=120):
+    renderer = HeadlessRenderer()
+    resources = sprite_resources(renderer)
+    group = EntityGroup()
+    alive = [Sprite(i, 0, resources) for i in range(live)]
+    group.add_many(alive)
+    group.init()
+    def churn(frame):
+        for i in range(per_frame):
+            slot = (frame * per_frame + i) % live
+            group.remove(alive[slot])
+            alive[slot] = Sprite(slot, frame, resources)
+            group.add(alive[slot])
+    return run_frames(group, renderer, frames, churn)
+
+def scenario_pooled_spawn_despawn(live=5000, per_frame=500, frames=120):
+    renderer = HeadlessRenderer()
+    resources = sprite_resources(renderer)
+    group = EntityGroup()
+    pool = group.create_pool(lambda: PooledSprite(0, 0, resources), live)
+    alive = [pool.spawn(i, 0) for i in range(live)]
+    group.init()
+    def churn(frame):
+        for i in range(per_frame):
+            slot = (frame * per_frame + i) % live
+            pool.release(alive[slot])
+            alive[slot] = pool.spawn(slot, frame)
+    results = run_frames(group, renderer, frames, churn)
+    results["pool_hit_rate"] = pool.stats()["hit_rate"]
+    return results
+
+def scenario_label_churn(count=200, frames=120):
+    renderer = HeadlessRenderer()
+    font = HeadlessFont()
+    group = EntityGroup()
+    labels = [Label(0, i * 20, "Score: 0", font, renderer) for i in range(count)]
+    group.add_many(labels)
+    group.init()
+    def churn(frame):
+        for i, label in enumerate(labels):
+            label.text = "Score: {}".format((frame * 7 + i) % 1000)
+    return run_frames(group, renderer, frames, churn)
+
+def scenario_mouse_flood(listeners=1000, frames=60):
+    renderer = HeadlessRenderer()
+    group = EntityGroup()
+    group.add_many([Pointer() for _ in range(listeners)])
+    group.init()
+    recording = mouse_flood_events(frames + 20)
+    def replay(frame):
+        group.handle_events(recording[frame], coalesce=True)
+    return run_frames(group, renderer, frames, replay)
+
+def scenario_level_load(count=10000):
+    renderer = HeadlessRenderer()
+    with tempfile.TemporaryDirectory() as directory:
+        level = os.path.join(directory, "level.toml")
+        with open(level, "w") as f:
+            for i in range(count):
+                f.write('[[entities]]\ntype = "Sprite"\npos = [{}, {}]\ntags = ["t{}"]\n'.format(
+                    i % 800, i // 800, i % 10
+                ))
+        results = {}
+        for run in ("cold", "cached"):
+            resources = sprite_resources(renderer)
+            group = EntityGroup()
+            start = time.perf_counter()
+            load_level(level, group, resources, {"Sprite": Sprite})
+            results[run + "_seconds"] = time.perf_counter() - start
+        return results
+
+class Garbage:
+    """Makes reference cycles every update, which only the GC can free. They
+    are kept alive for a number of frames, so that they reach the oldest
+    generation."""
+    def __init__(self, per_frame, lifetime=120):
+        self.per_frame = per_frame
+        self.recent = deque(maxlen=lifetime)
+
+    def update(self, delta_time):
+        cycles = []
+        for _ in range(self.per_frame):
+            a = {}
+            b = {"a": a}
+            a["b"] = b
+            cycles.append(a)
+        self.recent.append(cycles)
+
+def scenario_gc_hitches(live=300000, per_frame=2000, frames=300):
+    """Runs frames which make cyclic garbage next to many long-lived objects,
+    first with automatic garbage collection and then with the scheduler
+    controlling it, and counts the hitches of each."""
+    renderer = HeadlessRenderer()
+    group = EntityGroup()
+    group.add(Garbage(per_frame))
+    group.init()
+    long_lived = [{"i": i} for i in range(live)]
+    scheduler = FrameScheduler(frame_time=1 / 60)
+    results = {}
+    for controlled in (False, True):
+        if controlled:
+            scheduler.control_gc()
+        worst = 0.0
+        for _ in range(frames):
+            scheduler.begin_frame()
+            start = time.perf_counter()
+            group.update(1 / 60)
+            renderer.clear()
+            group.draw(renderer)
+            renderer.present()
+            worst = max(worst, time.perf_counter() - start)
+            scheduler.run_idle()
+            # Wait for the rest of the frame the way the main loop would
+            remaining = scheduler.time_left()
+            if remaining > 0:
+                time.sleep(remaining)
+        results[("controlled" if controlled else "automatic") + "_worst_frame_ms"] = worst * 1000
+    scheduler.release_gc()
+    report = scheduler.report()
+    results["automatic_hitches"] = report["uncontrolled"]["hitches"]
+    results["controlled_hitches"] = report["controlled"]["hitches"]
+    del long_lived
+    return results
+
+def scenario_snapshot_restore(count=10000, changed=100):
+    """Compares loading a level with restoring a snapshot of it from a file,
+    and measures saving a delta snapshot after a few entities moved."""
+    renderer = HeadlessRenderer()
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        level = os.path.join(directory, "level.toml")
+        with open(level, "w") as f:
+            for i in range(count):
+                f.write('[[entities]]\ntype = "Sprite"\npos = [{}, {}]\ntags = ["t{}"]\n'.format(
+                    i % 800, i // 800, i % 10
+                ))
+        resources = sprite_resources(renderer)
+        group = EntityGroup()
+        start = time.perf_counter()
+        load_level(level, group, resources, {"Sprite": Sprite})
+        results["load_level_seconds"] = time.perf_counter() - start
+        group.init()
+
+        path = os.path.join(directory, "level.snapshot")
+        start = time.perf_counter()
+        group.save_snapshot(path)
+        results["save_seconds"] = time.perf_counter() - start
+        results["snapshot_bytes"] = os.path.getsize(path)
+
+        start = time.perf_counter()
+        group.restore_snapshot(path, context=resources)
+        results["restore_seconds"] = time.perf_counter() - start
+
+        for entity in group._listeners["update"][:changed]:
+            entity.x += 1
+        start = time.perf_counter()
+        delta = group.save_snapshot(delta=True)
+        results["delta_save_seconds"] = time.perf_counter() - start
+        results["delta_bytes"] = len(delta)
+    return results
+
+SCENARIOS = {
+    "sprites_10k": scenario_sprites,
+    "component_sprites_10k": scenario_component_sprites,
+    "spawn_despawn": scenario_spawn_despawn,
+    "pooled_spawn_despawn": scenario_pooled_spawn_despawn,
+    "label_churn": scenario_label_churn,
+    "mouse_flood": scenario_mouse_flood,
+    "level_load": scenario_level_load,
+    "snapshot_restore": scenario_snapshot_restore,
+    "gc_hitches": scenario_gc_hitches,
+}
+# Scenarios which take long or hold much memory, and only run when named
+OPT_IN_SCENARIOS = {"gc_hitches"}
+
+def run_scenarios(names=None) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(__file__),
+            capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    results = {
+        "commit": commit,
+        "python": platform.python_version(),
+        "scenarios": {},
+    }
+    for name, scenario in SCENARIOS.items():
+        if names and name not in names:
+            continue
+        if not names and name in OPT_IN_SCENARIOS:
+            continue
+        results["scenarios"][name] = scenario()
+    return results
+
+def print_results(results: dict, baseline: dict = None):
+    for name, values in results["scenarios"].items():
+        print(name)
+        previous = baseline["scenarios"].get(name, {}) if baseline else {}
+        for key, value in values.items():
+            line = "  {:<26} {:>14,.3f}".format(key, value)
+            if previous.get(key):
+                line += "  ({:+.1%} vs {})".format(value / previous[key] - 1, baseline["commit"])
+            print(line)
+
+class Flock:
+    """Steers every entity of a component store towards the average position
+    of the others, which takes a Python loop over all of them."""
+    def __init__(self, store):
+        self.store = store
+
+    def update(self, delta_time):
+        store = self.store
+        n = store.count
+        xs, ys = store.columns["x"], store.columns["y"]
+        vxs, vys = store.columns["vx"], store.columns["vy"]
+        cx = sum(xs[i] for i in range(n)) / n
+        cy = sum(ys[i] for i in range(n)) / n
+        for i in range(n):
+            vxs[i] += (cx - xs[i]) * 0.01
+            vys[i] += (cy - ys[i]) * 0.01
+
+def build_arena(group, index, count=2000):
+    """Builds an independent group for the scaling benchmark."""
+    store = group.create_component_store(count)
+    for i in range(count):
+        store.spawn((i * 37 + index) % 800, (i * 53 + index) % 600, vx=1.0)
+    group.add(Flock(store))
+
+def bench_parallel_scaling(groups=8, frames=30, max_processes=None):
+    """Updates 'groups' independent arenas with 1 to max_processes worker
+    processes, doubling each time, and returns the frames per second of
+    each."""
+    if max_processes is None:
+        max_processes = os.cpu_count() or 1
+    results = {}
+    processes = 1
+    while True:
+        with ParallelUpdater([build_arena] * groups, processes, capacity=2000) as updater:
+            updater.update(1 / 60)
+            start = time.perf_counter()
+            for _ in range(frames):
+                updater.update(1 / 60)
+            results[processes] = frames / (time.perf_counter() - start)
+        if processes >= min(max_processes, groups):
+            break
+        processes = min(processes * 2, max_processes, groups)
+    return results
+
+STARTUP_SCRIPT = """
+import resource, sys, time
+start = time.perf_counter()
+import dalgi
+from dalgi.headless import HeadlessRenderer
+group = dalgi.EntityGroup()
+group.init()
+renderer = HeadlessRenderer()
+group.update(1 / 60)
+group.draw(renderer)
+renderer.present()
+first_frame = time.perf_counter() - start
+print(first_frame, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    int("sdl2" in sys.modules), int("ftoml" in sys.modules))
+"""
+
+def bench_startup():
+    """Runs a headless first frame in a new interpreter with
+    '-X importtime', and returns the import time of dalgi, the time until
+    the first frame, the peak resident memory at that point, and whether
+    sdl2 and the TOML parser were imported."""
+    package = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT],
+        cwd=os.path.dirname(package), capture_output=True, text=True, check=True
+    )
+    import_us = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == os.path.basename(package):
+            import_us = int(parts[1])
+    first_frame, max_rss_kb, sdl2, toml = result.stdout.split()
+    return {
+        "import_ms": import_us / 1000,
+        "first_frame_ms": float(first_frame) * 1000,
+        "max_rss_mb": int(max_rss_kb) / 1024,
+        "imported_sdl2": bool(int(sdl2)),
+        "imported_toml": bool(int(toml)),
+    }
+
+def run_micro_benchmarks():
+    scanning_churn = 2000
+    print("Spawn/despawn with 20k live entities:")
+    rate = bench_spawn_despawn(ScanningEntityGroup, churn=scanning_churn)
+    print("  scanning:   {:>12,.0f} entities/s".format(rate))
+    rate = bench_spawn_despawn(EntityGroup)
+    print("  membership: {:>12,.0f} entities/s".format(rate))
+
+    print("Mouse flood replay with 1k listeners:")
+    rate = bench_event_replay(coalesce=False)
+    print("  one by one: {:>12,.0f} events/s".format(rate))
+    rate = bench_event_replay(coalesce=True)
+    print("  coalesced:  {:>12,.0f} events/s".format(rate))
+
+    print("Tag query 'enemy AND visible AND NOT stunned' over 5k entities:")
+    rate, expected = bench_tag_query(compiled=False)
+    print("  set intersection: {:>12,.0f} queries/s".format(rate))
+    rate, matched = bench_tag_query(compiled=True)
+    assert(matched == expected)
+    print("  compiled query:   {:>12,.0f} queries/s".format(rate))
+
+def run_scaling_benchmark():
+    print("Parallel update of 8 independent arenas:")
+    results = bench_parallel_scaling()
+    single = results[1]
+    for processes, fps in results.items():
+        print("  {:>2} processes: {:>8.1f} frames/s ({:.2f}x)".format(processes, fps, fps / single))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("scenarios", nargs="*", help="scenarios to run (default: all but {})".format(
+        ", ".join(sorted(OPT_IN_SCENARIOS))
+    ))
+    parser.add_argument("--json", help="save the results to this file")
+    parser.add_argument("--compare", help="compare with results saved to this file")
+    parser.add_argument("--micro", action="store_true", help="also run the micro-benchmarks")
+    parser.add_argument("--startup", action="store_true",
+        help="also measure the import time and memory of a headless first frame")
+    parser.add_argument("--scaling", action="store_true",
+        help="also measure parallel updates with increasing numbers of processes")
+    args = parser.parse_args()
+
+    if args.micro:
+        run_micro_benchmarks()
+    if args.scaling:
+        run_scaling_benchmark()
+    if args.startup:
+        print("Startup of a headless first frame:")
+        for key, value in bench_startup().items():
+            print("  {}: {}".format(key, value))
+    results = run_scenarios(args.scenarios)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
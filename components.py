@@ -0,0 +1,155 @@
+from array import array
+from typing import Callable, List, Optional
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+COLUMNS = ("x", "y", "vx", "vy", "rotation", "sprite")
+
+class EntityHandle:
+    """A lightweight entity whose state is stored in the columns of a
+    component store. The handle stays valid until it is despawned."""
+    __slots__ = ("_store", "index")
+
+    def __init__(self, store: "ComponentStore", index: int):
+        self._store = store
+        self.index = index
+
+    def _column_property(name):
+        def get(self):
+            return self._store.columns[name][self.index]
+        def set(self, value):
+            self._store.columns[name][self.index] = value
+        return property(get, set)
+
+    x = _column_property("x")
+    y = _column_property("y")
+    vx = _column_property("vx")
+    vy = _column_property("vy")
+    rotation = _column_property("rotation")
+    sprite = _column_property("sprite")
+    del _column_property
+
+    @property
+    def alive(self) -> bool:
+        return self.index >= 0
+
+class ComponentStore:
+    """Stores the position, velocity, rotation and sprite ID of many entities
+    in one column per component, so that systems can process all of them in
+    one call. The columns are NumPy arrays when NumPy is installed, and
+    arrays from the 'array' module otherwise.
+    Add the store to an entity group to have it integrate motion on 'update'
+    and draw its entities on 'draw', using the draw functions in 'sprites'
+    indexed by sprite ID."""
+    def __init__(self, capacity: int = 1024, sprites: Optional[List[Callable]] = None):
+        self.capacity = 0
+        self.count = 0
+        self.columns = {}
+        self.sprites = sprites if sprites is not None else []
+        self._handles = [] # [EntityHandle] by index
+        self._screen_x = None
+        self._screen_y = None
+        self._allocate(max(capacity, 1))
+
+    def _allocate(self, capacity: int):
+        """Grows every column, and the offset buffers, to the capacity."""
+        for name in COLUMNS:
+            # 'q' is 8 bytes on every platform, unlike 'l'
+            typecode = "q" if name == "sprite" else "d"
+            old = self.columns.get(name)
+            if numpy is not None:
+                column = numpy.zeros(capacity, dtype=numpy.int64 if typecode == "q" else numpy.float64)
+                if old is not None:
+                    column[:self.count] = old[:self.count]
+            else:
+                column = array(typecode, bytes(capacity * array(typecode).itemsize))
+                if old is not None:
+                    column[:self.count] = old[:self.count]
+            self.columns[name] = column
+        if numpy is not None:
+            self._screen_x = numpy.zeros(capacity)
+            self._screen_y = numpy.zeros(capacity)
+        self.capacity = capacity
+
+    def spawn(self, x: float, y: float, vx: float = 0.0, vy: float = 0.0,
+            rotation: float = 0.0, sprite: int = 0) -> EntityHandle:
+        if self.count == self.capacity:
+            self._allocate(self.capacity * 2)
+        index = self.count
+        columns = self.columns
+        columns["x"][index] = x
+        columns["y"][index] = y
+        columns["vx"][index] = vx
+        columns["vy"][index] = vy
+        columns["rotation"][index] = rotation
+        columns["sprite"][index] = sprite
+        handle = EntityHandle(self, index)
+        self._handles.append(handle)
+        self.count += 1
+        return handle
+
+    def despawn(self, handle: EntityHandle):
+        """Removes the entity by moving the last entity into its place."""
+        index = handle.index
+        assert(index >= 0 and self._handles[index] is handle)
+        last = self.count - 1
+        if index != last:
+            for column in self.columns.values():
+                column[index] = column[last]
+            moved = self._handles[last]
+            moved.index = index
+            self._handles[index] = moved
+        self._handles.pop()
+        handle.index = -1
+        self.count = last
+
+    def __len__(self) -> int:
+        return self.count
+
+    def integrate(self, delta_time: float):
+        """Moves every entity by its velocity."""
+        n = self.count
+        columns = self.columns
+        if numpy is not None:
+            x = columns["x"][:n]
+            y = columns["y"][:n]
+            x += columns["vx"][:n] * delta_time
+            y += columns["vy"][:n] * delta_time
+            return
+        xs, ys, vxs, vys = columns["x"], columns["y"], columns["vx"], columns["vy"]
+        for i in range(n):
+            xs[i] += vxs[i] * delta_time
+            ys[i] += vys[i] * delta_time
+
+    def screen_positions(self, ox: float, oy: float):
+        """Returns the x and y columns offset by the given amount, in buffers
+        which are reused between calls."""
+        n = self.count
+        columns = self.columns
+        if numpy is not None:
+            numpy.add(columns["x"][:n], ox, out=self._screen_x[:n])
+            numpy.add(columns["y"][:n], oy, out=self._screen_y[:n])
+            return self._screen_x[:n], self._screen_y[:n]
+        xs = columns["x"]
+        ys = columns["y"]
+        return [xs[i] + ox for i in range(n)], [ys[i] + oy for i in range(n)]
+
+    def update(self, delta_time: float):
+        self.integrate(delta_time)
+
+    def draw(self, renderer, ox, oy):
+        xs, ys = self.screen_positions(ox, oy)
+        if numpy is not None:
+            xs = xs.tolist()
+            ys = ys.tolist()
+            rotations = self.columns["rotation"][:self.count].tolist()
+            sprite_ids = self.columns["sprite"][:self.count].tolist()
+        else:
+            rotations = self.columns["rotation"]
+            sprite_ids = self.columns["sprite"]
+        sprites = self.sprites
+        for i in range(self.count):
+            sprites[sprite_ids[i]](xs[i], ys[i], rotations[i])
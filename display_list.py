@@ -0,0 +1,84 @@
+from sdl2 import Rect
+
+# Kinds of draw commands
+FILL = 0 # paint is a color
+COPY = 1 # paint is a texture, with an optional source rect
+DRAW = 2 # paint is an entity which draws itself
+
+class LayerDisplayList:
+    """The retained draw commands of one draw layer of an entity group.
+    Entities with a 'display_commands' method describe themselves as
+    commands of (kind, paint, source rect, rect), where the rect belongs to
+    the entity and may be moved in place. The commands are only asked for
+    again when the layer changes or the 'revision' of one of its entities
+    does. Each command gets its own destination rect, which is updated in
+    place when the rect of the entity or the group offset moves, so drawing
+    an unchanged layer allocates nothing."""
+    def __init__(self):
+        self.version = -1 # The version of the layer the commands are from
+        self.static = False
+        self.commands = [] # [(kind, paint, source rect, destination rect, entity rect)]
+        self._revisions = [] # [(entity, revision)]
+        self._synced = False
+        self._ox = 0
+        self._oy = 0
+
+    def is_stale(self, version: int) -> bool:
+        """Returns whether the layer or one of its entities changed. The
+        entities of static layers are not checked."""
+        if version != self.version:
+            return True
+        if self.static:
+            return False
+        for entity, revision in self._revisions:
+            if getattr(entity, "revision", 0) != revision:
+                return True
+        return False
+
+    def rebuild(self, drawables: list, version: int):
+        commands = []
+        revisions = []
+        for entity in drawables:
+            if entity is None:
+                continue
+            if not hasattr(entity, "display_commands"):
+                commands.append((DRAW, entity, None, None, None))
+                continue
+            revisions.append((entity, getattr(entity, "revision", 0)))
+            for kind, paint, src, rect in entity.display_commands():
+                commands.append((kind, paint, src, Rect(rect.x, rect.y, rect.w, rect.h), rect))
+        self.commands = commands
+        self._revisions = revisions
+        self.version = version
+        self._synced = False
+
+    def sync(self, ox: int, oy: int):
+        """Moves the destination rects to the entity rects offset by the
+        given amount."""
+        for kind, _, _, dst, rect in self.commands:
+            if kind == DRAW:
+                continue
+            x = rect.x + ox
+            y = rect.y + oy
+            if dst.x != x or dst.y != y or dst.w != rect.w or dst.h != rect.h:
+                dst.x = x
+                dst.y = y
+                dst.w = rect.w
+                dst.h = rect.h
+        self._synced = True
+        self._ox = ox
+        self._oy = oy
+
+    def submit(self, renderer, ox: int, oy: int):
+        # Static layers only follow their entities when rebuilt or moved
+        if not self.static or not self._synced or self._ox != ox or self._oy != oy:
+            self.sync(ox, oy)
+        c_fill_rect = renderer.c_fill_rect
+        copy = renderer.copy
+        for kind, paint, src, dst, _ in self.commands:
+            if kind == FILL:
+                c_fill_rect(paint, dst)
+            elif kind == COPY:
+                copy(paint, src_rect=src, dst_rect=dst)
+            else:
+                paint.draw(renderer, ox, oy)
@@ -1,14 +1,30 @@
+from __future__ import annotations
 from collections import deque
-from sdl2.events import Quit, KeyDown, KeyUp, MouseButtonDown, MouseButtonUp
-from sdl2.events import MouseMotion, MouseWheel, TextInput, DropFile
-from sdl2 import Renderer, MouseButton, Event
+from .messages import MessageBus, Message
+from .pool import EntityPool
+from .spatial_index import SpatialGrid, Bounds, overlaps, union
+from .tag_query import TagQuery
 import os
-from typing import Any, Optional, Callable, Iterator, cast
+from typing import Any, Optional, Callable, Iterable, Iterator, TYPE_CHECKING
+
+# sdl2, NumPy, asyncio and the thread pool are only imported when first
+# needed, so that groups are quick to import and can be used without sdl2
+if TYPE_CHECKING:
+    from sdl2.events import KeyDown, KeyUp
+    from sdl2 import Renderer, MouseButton, Event
+    from .components import ComponentStore
+
+# Bound by 'enable_dirty_rendering' and 'enable_display_lists', so that only
+# groups drawing with them import sdl2, and drawing does not import again
+Rect = None
+LayerDisplayList = None
 
 LISTENERS = [
     "init",
     "destroy",
     "update",
+    "async_update",
+    "interpolate",
     "key_pressed",
     "key_repeated",
     "key_released",
@@ -22,271 +38,1222 @@ LISTENERS = [
     "quit",
 ]
 DEFAULT_DRAW_LAYER = 1
+
+# Listeners which only receive events under their bounds, when the group has
+# a spatial index
+POINTER_LISTENERS = ("mouse_pressed", "mouse_released", "mouse_moved")
+
+# Commands buffered until the next call to 'EntityGroup.commit'
+_ADD = 0
+_REMOVE = 1
+_DESTROY = 2
+_ADD_TAGS = 3
+_REMOVE_TAGS = 4
+
+# A listener list is compacted once at least this fraction of it is
+# tombstones left by removed entities
+COMPACT_FRACTION = 0.5
+
+# {class: (listener categories, is drawable, has bounds)}
+_capabilities = {}
+
+def _capabilities_of(cls: type) -> tuple:
+    """Returns the listener categories of the given entity class, whether it
+    can be drawn and whether it has bounds. The result is cached per class."""
+    capabilities = _capabilities.get(cls)
+    if capabilities is None:
+        categories = tuple(c for c in LISTENERS if hasattr(cls, c))
+        capabilities = (categories, hasattr(cls, "draw"), hasattr(cls, "bounds"))
+        _capabilities[cls] = capabilities
+    return capabilities
+
+# Attributes which make an entity a listener, drawable or bounded
+_CAPABILITY_NAMES = frozenset(LISTENERS + ["draw", "bounds"])
+
+def _capabilities_of_entity(entity: Any) -> tuple:
+    """Returns the capabilities of the entity, which are those of its class
+    unless listener methods were set on the entity itself."""
+    capabilities = _capabilities_of(type(entity))
+    attributes = getattr(entity, "__dict__", None)
+    if not attributes or _CAPABILITY_NAMES.isdisjoint(attributes):
+        return capabilities
+    categories = tuple(c for c in LISTENERS if hasattr(entity, c))
+    return (categories, hasattr(entity, "draw"), hasattr(entity, "bounds"))
+
+def invalidate_capabilities(cls: Optional[type] = None):
+    """Forgets the cached listener categories of the given class and its
+    subclasses, or of every class if none is given.
+    This must be called when listener methods are added to or removed from a
+    class after instances of it have been added to a group. It only affects
+    entities added afterwards: entities already in a group keep the
+    listeners they were added with, until they are removed and added again.
+    Listener methods set on individual instances are detected when the
+    entity is added."""
+    if cls is None:
+        _capabilities.clear()
+        return
+    pending = [cls]
+    while pending:
+        cls = pending.pop()
+        _capabilities.pop(cls, None)
+        pending.extend(cls.__subclasses__())
+
+class _Membership:
+    """Records where an entity is stored in its group, so that it can be
+    removed without searching through every list."""
+    __slots__ = ("listeners", "layer", "slot", "mask")
+    
+    def __init__(self):
+        self.listeners = {} # {category: index}
+        self.layer = None
+        self.slot = None
+        self.mask = 0 # The bits of the tags of the entity
+
 class EntityGroup:
     def __init__(self, x: int = 0, y: int = 0) -> None:
-        self.x = x
-        self.y = y
+        self._x = x
+        self._y = y
+        self._world_x = x # The cached position on the screen
+        self._world_y = y
+        self._world_valid = False
+        self._child_groups = {} # {EntityGroup: None}
+        self.enabled = True # Disabled groups are not updated, drawn or sent input
+        self.paused = False # Paused groups are drawn and sent input, but not updated
+        self.hit_area = None # (w, h) outside of which pointer events are ignored
         self._listeners = {}
+        self._listener_tombstones = {} # {category: count}
         for category in LISTENERS:
             self._listeners[category] = []
-        self._tags = {}
-        self._entities = set()
-        self._tagged = {}
+            self._listener_tombstones[category] = 0
+        self._entities = {} # {entity: _Membership}
+        self._tag_bits = {} # {tag: bit}
+        self._tag_names = [] # [tag] by bit index
+        self._queries = {} # {(required mask, excluded mask): TagQuery}
         self._drawables = { DEFAULT_DRAW_LAYER : [] }
+        self._tombstones = { DEFAULT_DRAW_LAYER : 0 }
         self._layers = [ DEFAULT_DRAW_LAYER ]
-        self._messages = set()
-        self._message_handlers = {} # {message: {entity: handler}}
-        self._destruction_queue = deque()
-        self._removal_queue = deque()
+        self.messages = MessageBus()
+        self._commands = []
+        self._deferred = False
+        self._spatial_index = None
+        self._unindexed_pointer_listeners = {} # {category: {entity: None}}
+        self._mouse_capture = None
+        self.viewport = None # (x, y, w, h) in screen coordinates
+        self._dirty_rendering = False
+        self._retained = False # Whether the render target keeps its contents
+        self._drawn = {} # {entity: (bounds, revision)}
+        self._dirty = None # Bounds to redraw, relative to the group
+        self._redraw_all = True
+        self.background = (255, 255, 255)
+        self.profiler = None
+        self.components = None
+        self._display_lists = None # {layer: LayerDisplayList}
+        self._layer_versions = { DEFAULT_DRAW_LAYER : 0 }
+        self._drops = deque() # [(path, future is_dir)]
+        self._drop_executor = None
+        # Counts from the last call to 'draw'
+        self.drawn_count = 0
+        self.culled_count = 0
+        self.skipped_count = 0
         self.parent = None
+        self.quit_requested = False
+        self._snapshotter = None
+        self._async_tasks = {} # {entity: task of its running 'async_update'}
+        self.async_timeouts = 0 # Updates which outlived the timeout of their frame
     
     def init(self, parent: Any=None):
         """Called when all entities have been added to the group, and is meant
         to let entities refer to the group and make connections to other
         entities."""
         self.parent = parent
+        self._invalidate_world()
+        self.commit()
+        # From now on, listeners are being iterated, so changes wait for the
+        # next commit
+        self._deferred = True
         for listener in self._listeners["init"]:
+            if listener is None:
+                continue
             listener.init(self)
         
+    @property
+    def x(self) -> int:
+        """The horizontal offset of the group from its parent group."""
+        return self._x
+    
+    @x.setter
+    def x(self, value: int):
+        if value != self._x:
+            self._x = value
+            self._invalidate_world()
+    
+    @property
+    def y(self) -> int:
+        """The vertical offset of the group from its parent group."""
+        return self._y
+    
+    @y.setter
+    def y(self, value: int):
+        if value != self._y:
+            self._y = value
+            self._invalidate_world()
+    
+    def _invalidate_world(self):
+        # Descendants of an outdated group are always outdated, as they
+        # compute their positions from it
+        if not self._world_valid:
+            return
+        self._world_valid = False
+        for child in self._child_groups:
+            child._invalidate_world()
+    
+    def world_position(self) -> tuple:
+        """Returns the position of the group on the screen. It is cached, and
+        only computed again after the group or one of its ancestors moved."""
+        if not self._world_valid:
+            if isinstance(self.parent, EntityGroup):
+                px, py = self.parent.world_position()
+            else:
+                px, py = 0, 0
+            self._world_x = px + self._x
+            self._world_y = py + self._y
+            self._world_valid = True
+        return (self._world_x, self._world_y)
+    
     def add(self, entity: Any, draw_layer: int = DEFAULT_DRAW_LAYER):
-        """Adds a new entity to the group"""
+        """Adds a new entity to the group.
+        Before the group is initialized, the entity is added immediately, and
+        afterwards at the next commit, which also initializes it."""
+        if self._deferred:
+            self._commands.append((_ADD, entity, draw_layer))
+            return
         assert(entity not in self._entities)
-        if hasattr(entity, "draw"):
-            if not draw_layer in self._drawables:
-                self._drawables[draw_layer] = []
-                self._layers.append(draw_layer)
-                self._layers.sort()
-            self._drawables[draw_layer].append(entity)
-        
-        for category, entities in self._listeners.items():
-            if hasattr(entity, category):
-                entities.append(entity)
-        
-        self._entities.add(entity)
+        self._add_entities({entity: draw_layer})
+    
+    def add_many(self, entities: Iterable[Any], draw_layer: int = DEFAULT_DRAW_LAYER):
+        """Adds several entities to the same draw layer of the group.
+        Before the group is initialized, the listener lists are extended
+        directly instead of going through the command buffer."""
+        if self._deferred:
+            self._commands.extend((_ADD, entity, draw_layer) for entity in entities)
+            return
+        added = dict.fromkeys(entities, draw_layer)
+        assert(len(self._entities.keys() & added.keys()) == 0)
+        self._add_entities(added)
+    
+    def add_to_layers(self, entities: dict):
+        """Adds the given {entity: draw_layer} entities in one pass, keeping
+        their order in the listener lists even when their layers differ."""
+        if self._deferred:
+            self._commands.extend((_ADD, entity, draw_layer) for entity, draw_layer in entities.items())
+            return
+        assert(len(self._entities.keys() & entities.keys()) == 0)
+        self._add_entities(dict(entities))
+    
+    def replace_entities(self, entities: dict, tagged: Iterable[tuple] = ()):
+        """Replaces every entity of the group with the given {entity:
+        draw_layer} entities, in order, and tags them with the given
+        (entity, tags), rebuilding the listener lists and draw layers in one
+        pass. A draw layer of None stands for the default one.
+        Pending commands are dropped. The old entities are destroyed, and
+        the new ones are initialized if the group already has been.
+        The message handlers of the old entities are disconnected, so the
+        new ones only receive messages they connect to in 'init'."""
+        self._commands = []
+        old = self._entities
+        for entity, record in old.items():
+            self._destroy_entity(entity, record)
+        if old:
+            self._remove_entities(dict.fromkeys(old, True))
+        added = {
+            entity: DEFAULT_DRAW_LAYER if draw_layer is None else draw_layer
+            for entity, draw_layer in entities.items()
+        }
+        self._add_entities(added)
+        for entity, tags in tagged:
+            self._add_tags(entity, tuple(tags))
+        if self._deferred:
+            self._init_entities(added)
+    
+    def save_snapshot(self, path: Optional[str] = None, delta: bool = False) -> bytes:
+        """Returns a binary snapshot of the entities, draw layers and tags of
+        the group, and writes it to the path if one is given. A delta
+        snapshot only contains what changed since the previous snapshot.
+        The classes of the entities must be registered with
+        'dalgi.snapshot.register'."""
+        if self._snapshotter is None:
+            from .snapshot import Snapshotter
+            self._snapshotter = Snapshotter(self)
+        return self._snapshotter.save(path, delta)
     
-    def register_messages(self, *messages: str):
-        for message in messages:
-            self._messages.add(message)
-            if not message in self._message_handlers:
-                self._message_handlers[message] = {}
+    def restore_snapshot(self, *snapshots, context: Any = None):
+        """Replaces the entities of the group with those of a full snapshot,
+        followed by the delta snapshots made after it, in order. Snapshots
+        are given as bytes, or as paths of files which are memory-mapped.
+        The context, such as the resources, is passed to the restore hooks.
+        Restored entities are initialized again, which is where they must
+        connect to messages, as connections are not saved."""
+        if self._snapshotter is None:
+            from .snapshot import Snapshotter
+            self._snapshotter = Snapshotter(self)
+        self._snapshotter.restore(*snapshots, context=context)
     
-    def connect(self, entity: Any, message: str, handler: Callable):
-        #print("Connecting {} -> {}".format(entity, message))
-        handlers = self._message_handlers.setdefault(message, {})
-        assert(entity not in handlers)
-        handlers[entity] = handler
+    def create_component_store(self, capacity: int = 1024, sprites: Optional[list] = None,
+            draw_layer: int = DEFAULT_DRAW_LAYER) -> ComponentStore:
+        """Creates a store for lightweight entities whose positions,
+        velocities, rotations and sprites are kept in arrays, and adds it to
+        the group so that all of them are moved on 'update' and drawn on
+        'draw' in one call each."""
+        from .components import ComponentStore
+        assert(self.components is None)
+        self.components = ComponentStore(capacity, sprites)
+        self.add(self.components, draw_layer)
+        return self.components
     
-    def send_message(self, message: str, *args):
-        assert(message in self._messages)
-        for handler in self._message_handlers[message].values():
-            handler(*args)
+    def create_pool(self, factory: Callable[[], Any], size: int,
+            draw_layer: int = DEFAULT_DRAW_LAYER, grow: bool = True) -> EntityPool:
+        """Creates a pool of 'size' entities made by 'factory', and adds it to
+        the group. Entities spawned from the pool are updated and drawn by it,
+        and are reused when released instead of being added and removed."""
+        pool = EntityPool(factory, size, grow)
+        self.add(pool, draw_layer)
+        return pool
+    
+    def register_messages(self, *messages: str) -> tuple:
+        """Registers the messages, and returns their channel IDs, which can be
+        used instead of the names for faster sends."""
+        return self.messages.register(*messages)
+    
+    def connect(self, entity: Any, message: Message, handler: Callable):
+        """Connects a handler of the entity to the message. The handler is
+        disconnected when the entity is removed."""
+        self.messages.connect(entity, message, handler)
+    
+    def send_message(self, message: Message, *args):
+        """Sends the message to its handlers immediately."""
+        self.messages.send(message, *args)
+    
+    def post_message(self, message: Message, *args):
+        """Queues the message for delivery at the beginning of the next call to
+        'update'. Duplicates of a queued message are dropped."""
+        self.messages.post(message, *args)
     
     def validate_message_connections(self, ignore: Optional[set]=None):
         """Validates that all messages are used"""
-        if ignore is None:
-            ignore = set()
-        unused = []
-        unregistered = []
-        for message, handlers in self._message_handlers.items():
-            if message not in self._messages:
-                unregistered.append(message)
-                continue
-            if not handlers:
-                if message in ignore:
-                    continue
-                unused.append(message)
-        
-        if unused or unregistered:
-            raise Exception("Unregistered message(s): {}, Unused message type(s): {}".format(
-                unregistered, unused
-            ))
+        self.messages.validate(ignore)
     
     def remove(self, entity: Any):
-        """Queues the removal of this entity at the beginning of the next call
-        to 'update'"""
-        self._removal_queue.append(entity)
+        """Queues the removal of this entity at the next commit, which happens
+        at the beginning of the next call to 'update', or in 'init' for
+        removals queued before the group is initialized"""
+        self._commands.append((_REMOVE, entity, None))
     
-    def _remove(self, entity: Any):
-        assert(entity in self._entities)
-        for tag, entities in self._tagged.items():
-            for i, ent in enumerate(entities):
-                if ent == entity:
-                    entities.remove(i)
-                    break
+    def destroy(self, entity: Any):
+        """Queues the destruction of this entity at the next commit, which
+        happens at the beginning of the next call to 'update', or in 'init'
+        for destructions queued before the group is initialized"""
+        self._commands.append((_DESTROY, entity, None))
+    
+    def commit(self):
+        """Applies the additions, removals, destructions and tag changes made
+        since the last commit, as a single batch. Entities added after the
+        group was initialized are initialized once they are added.
+        Commands are reduced to their net effect first, so each listener list
+        and draw layer is changed at most once. Changes made by 'destroy'
+        handlers are applied at the following commit."""
+        if not self._commands:
+            return
+        commands = self._commands
+        self._commands = []
         
-        if hasattr(entity, "draw"):
-            for layer in self._drawables:
-                for i, ent in enumerate(layer):
-                    if ent == entity:
-                        layer.remove(i)
-                        break
+        added = {} # {entity: draw_layer}
+        removed = {} # {entity: should_destroy}
+        tag_changes = []
+        for command, entity, arg in commands:
+            if command == _ADD:
+                assert(entity not in added)
+                assert(entity not in self._entities or entity in removed)
+                added[entity] = arg
+            elif command == _REMOVE or command == _DESTROY:
+                if entity in added:
+                    del added[entity]
+                    if entity not in self._entities:
+                        continue
+                assert(entity in self._entities)
+                removed[entity] = removed.get(entity, False) or command == _DESTROY
+            else:
+                tag_changes.append((command, entity, arg))
         
-        for category in LISTENERS:
-            if hasattr(entity, category):
-                for i, ent in enumerate(self._listeners[category]):
-                    if ent == entity:
-                        self._listeners[category].remove(i)
-                        break
+        for entity, should_destroy in removed.items():
+            if should_destroy:
+                self._destroy_entity(entity, self._entities[entity])
         
-        for handlers in self._message_handlers.values():
-            if entity in handlers:
-                handlers.remove(entity)
+        if removed:
+            self._remove_entities(removed)
+        if added:
+            self._add_entities(added)
+            # Entities added before 'init' are initialized by it
+            if self._deferred:
+                self._init_entities(added)
         
-        self._entities.remove(entity)
+        for command, entity, tags in tag_changes:
+            if entity not in self._entities:
+                continue
+            if command == _ADD_TAGS:
+                self._add_tags(entity, tags)
+            else:
+                self._remove_tags(entity, tags)
     
-    def destroy(self, entity: Any):
-        """Queues the destruction of this entity at the beginning of the next
-        call to 'update'"""
-        self._destruction_queue.append(entity)
+    def _init_entities(self, added: dict):
+        """Initializes entities added after the group was initialized."""
+        entities = self._entities
+        for entity in added:
+            if "init" in entities[entity].listeners:
+                entity.init(self)
     
-    def _destroy(self, entity: Any):
-        assert(entity in self._entities)
-        if hasattr(entity, "destroy"):
+    def _destroy_entity(self, entity: Any, record: _Membership):
+        # The 'destroy' of a group queues the destruction of one of its own
+        # entities, so child groups are torn down instead
+        if entity in self._child_groups:
+            entity.teardown()
+        elif "destroy" in record.listeners:
             entity.destroy()
-        self._remove(entity)
+    
+    def teardown(self):
+        """Called when the group is destroyed by its parent group, and calls
+        the 'destroy' listeners of every entity of the group, including
+        those of nested groups."""
+        for entity, record in self._entities.items():
+            self._destroy_entity(entity, record)
+        if self._drop_executor is not None:
+            self._drop_executor.shutdown(wait=False)
+            self._drop_executor = None
+    
+    def _add_entities(self, added: dict):
+        """Adds the given {entity: draw_layer} entities, extending each list
+        once."""
+        new_listeners = {}
+        new_drawables = {}
+        for entity, draw_layer in added.items():
+            categories, drawable, _ = _capabilities_of_entity(entity)
+            record = _Membership()
+            if drawable:
+                record.layer = draw_layer
+                new_drawables.setdefault(draw_layer, []).append(entity)
+            for category in categories:
+                new_listeners.setdefault(category, []).append(entity)
+            self._entities[entity] = record
+        
+        for category, entities in new_listeners.items():
+            listeners = self._listeners[category]
+            for index, entity in enumerate(entities, len(listeners)):
+                self._entities[entity].listeners[category] = index
+            listeners.extend(entities)
+        
+        for layer, entities in new_drawables.items():
+            if not layer in self._drawables:
+                self._drawables[layer] = []
+                self._tombstones[layer] = 0
+                self._layer_versions[layer] = 0
+                self._layers.append(layer)
+                self._layers.sort()
+            self._layer_versions[layer] += 1
+            drawables = self._drawables[layer]
+            for slot, entity in enumerate(entities, len(drawables)):
+                self._entities[entity].slot = slot
+            drawables.extend(entities)
+        
+        if self._spatial_index is not None:
+            for entity in added:
+                self._index(entity)
+        
+        for entity in added:
+            if isinstance(entity, EntityGroup):
+                self._child_groups[entity] = None
+                entity.parent = self
+                entity._invalidate_world()
+    
+    def _remove_entities(self, removed: dict):
+        """Removes the given entities from every list they are in.
+        Removed entities leave tombstones in the listener lists and draw
+        layers, which are compacted once they make up a large part of a
+        list, so the order of the remaining entities is kept."""
+        records = [self._entities[entity] for entity in removed]
+        categories = set()
+        layers = set()
+        for entity, record in zip(removed, records):
+            if record.mask:
+                self._set_mask(entity, record, 0)
+            self.messages.disconnect(entity)
+            for category, index in record.listeners.items():
+                self._listeners[category][index] = None
+                self._listener_tombstones[category] += 1
+                categories.add(category)
+            if record.layer is not None:
+                self._drawables[record.layer][record.slot] = None
+                self._tombstones[record.layer] += 1
+                layers.add(record.layer)
+        
+        for entity in removed:
+            del self._entities[entity]
+            if entity in self._child_groups:
+                del self._child_groups[entity]
+                entity.parent = None
+                entity._invalidate_world()
+        
+        for category in categories:
+            if self._listener_tombstones[category] >= len(self._listeners[category]) * COMPACT_FRACTION:
+                self._compact_listeners(category)
+        
+        for layer in layers:
+            self._layer_versions[layer] += 1
+            if self._tombstones[layer] * 2 >= len(self._drawables[layer]):
+                self._compact_layer(layer)
+        
+        if self._spatial_index is not None:
+            for entity in removed:
+                self._unindex(entity)
+        if self._dirty_rendering:
+            for entity in removed:
+                self._invalidate_drawn(entity)
+        if self._mouse_capture in removed:
+            self._mouse_capture = None
+    
+    def _compact_listeners(self, category: str):
+        compacted = [entity for entity in self._listeners[category] if entity is not None]
+        for index, entity in enumerate(compacted):
+            self._entities[entity].listeners[category] = index
+        self._listeners[category] = compacted
+        self._listener_tombstones[category] = 0
+    
+    def _compact_layer(self, layer: int):
+        compacted = [entity for entity in self._drawables[layer] if entity is not None]
+        for slot, entity in enumerate(compacted):
+            self._entities[entity].slot = slot
+        self._drawables[layer] = compacted
+        self._tombstones[layer] = 0
+    
+    def enable_spatial_index(self, cell_size: int = 64):
+        """Indexes entities with a 'bounds' method by their bounds, which is
+        the tuple (x, y, w, h) relative to the group.
+        Mouse presses, releases and motions are then only sent to the indexed
+        entities under the cursor, as well as to listeners without bounds and
+        the entity capturing the mouse. If 'viewport' is set, indexed
+        entities outside of it are not drawn.
+        Entities must call 'moved' when their bounds change."""
+        self._spatial_index = SpatialGrid(cell_size)
+        self._unindexed_pointer_listeners = {c: {} for c in POINTER_LISTENERS}
+        for entity in self._entities:
+            self._index(entity)
+    
+    def _index(self, entity: Any):
+        categories, _, bounded = _capabilities_of_entity(entity)
+        if bounded:
+            self._spatial_index.insert(entity, entity.bounds())
+            return
+        for category in POINTER_LISTENERS:
+            if category in categories:
+                self._unindexed_pointer_listeners[category][entity] = None
+    
+    def _unindex(self, entity: Any):
+        if entity in self._spatial_index:
+            self._spatial_index.remove(entity)
+            return
+        for listeners in self._unindexed_pointer_listeners.values():
+            listeners.pop(entity, None)
+    
+    def moved(self, entity: Any):
+        """Updates the spatial index after the bounds of the entity changed."""
+        index = self._spatial_index
+        if index is not None and entity in index:
+            index.move(entity, entity.bounds())
+    
+    def find_all_at(self, x: int, y: int) -> Iterator[Any]:
+        """Returns the indexed entities whose bounds contain the given point,
+        relative to the group."""
+        assert(self._spatial_index is not None)
+        return iter(self._spatial_index.query_point(x, y))
+    
+    def capture_mouse(self, entity: Any):
+        """Sends all mouse presses, releases and motions to the entity, even
+        when the cursor is outside of its bounds."""
+        assert(entity in self._entities)
+        self._mouse_capture = entity
+        if isinstance(self.parent, EntityGroup):
+            self.parent.capture_mouse(self)
+    
+    def release_mouse(self, entity: Any):
+        if self._mouse_capture is entity:
+            self._mouse_capture = None
+            if isinstance(self.parent, EntityGroup):
+                self.parent.release_mouse(self)
+    
+    def _pointer_listeners(self, category: str, x: int, y: int) -> list:
+        """Returns the listeners of the given pointer category which should
+        receive an event at the given point, relative to the group."""
+        listeners = list(self._unindexed_pointer_listeners[category])
+        entities = self._entities
+        for entity in self._spatial_index.query_point(x, y):
+            if category in entities[entity].listeners:
+                listeners.append(entity)
+        capture = self._mouse_capture
+        if (capture is not None and category in entities[capture].listeners
+                and capture not in listeners):
+            listeners.append(capture)
+        return listeners
     
     def add_tags(self, entity: Any, *tags: str):
+        """Tags the entity. Before the group is initialized, the tags are
+        added immediately, and afterwards at the next commit."""
+        if self._deferred:
+            self._commands.append((_ADD_TAGS, entity, tags))
+            return
         assert(entity in self._entities)
+        self._add_tags(entity, tags)
+    
+    def _tag_bit(self, tag: str) -> int:
+        bit = self._tag_bits.get(tag)
+        if bit is None:
+            bit = self._tag_bits[tag] = 1 << len(self._tag_names)
+            self._tag_names.append(tag)
+        return bit
+    
+    def _set_mask(self, entity: Any, record: _Membership, mask: int):
+        """Changes the tag mask of the entity, and updates the queries which
+        depend on the changed tags."""
+        old = record.mask
+        if old == mask:
+            return
+        record.mask = mask
+        changed = old ^ mask
+        for query in self._queries.values():
+            if (query.required | query.excluded) & changed:
+                query.update(entity, old, mask)
+    
+    def _add_tags(self, entity: Any, tags: tuple):
+        record = self._entities[entity]
+        mask = record.mask
         for tag in tags:
-            if not tag in self._tagged:
-                self._tagged[tag] = set()
-            self._tagged[tag].add(entity)
+            mask |= self._tag_bit(tag)
+        self._set_mask(entity, record, mask)
+    
+    def tags_of(self, entity: Any) -> list:
+        """Returns the tags of the entity."""
+        mask = self._entities[entity].mask
+        return [tag for i, tag in enumerate(self._tag_names) if mask >> i & 1]
+    
+    def query(self, *tags: str, exclude: Iterable[str] = ()) -> TagQuery:
+        """Returns the query for the entities with all of the given tags and
+        none of the excluded ones. Queries are compiled once, and their
+        results are then kept up to date as tags change, so that a query
+        costs nothing to run again."""
+        assert(tags)
+        required = 0
+        for tag in tags:
+            required |= self._tag_bit(tag)
+        excluded = 0
+        for tag in exclude:
+            excluded |= self._tag_bit(tag)
+        key = (required, excluded)
+        query = self._queries.get(key)
+        if query is None:
+            query = self._queries[key] = TagQuery(required, excluded)
+            for entity, record in self._entities.items():
+                if record.mask:
+                    query.update(entity, 0, record.mask)
+        return query
     
     def find_all_with_tag(self, tag: str) -> Iterator[Any]:
-        assert(tag in self._tagged)
-        return self._tagged[tag]
+        """Returns a read-only view of the entities with the tag."""
+        assert(tag in self._tag_bits)
+        return self.query(tag).results
     
     def remove_tags(self, entity, *tags: str):
+        """Removes tags from the entity. Before the group is initialized, the
+        tags are removed immediately, and afterwards at the next commit."""
+        if self._deferred:
+            self._commands.append((_REMOVE_TAGS, entity, tags))
+            return
         assert(entity in self._entities)
+        self._remove_tags(entity, tags)
+    
+    def _remove_tags(self, entity: Any, tags: tuple):
+        record = self._entities[entity]
+        mask = record.mask
         for tag in tags:
-            assert(tag in self._tagged)
-            entities = self._tagged[tag]
-            for i, ent in enumerate(entities):
-                if ent == entity:
-                    entities.remove(i)
-                    break
+            assert(tag in self._tag_bits)
+            mask &= ~self._tag_bits[tag]
+        self._set_mask(entity, record, mask)
     
     def update(self, delta_time: float):
-        while self._destruction_queue:
-            self._destroy(self._destruction_queue.popleft())
+        if self.paused or not self.enabled:
+            return
+        if self.profiler is not None:
+            return self._update_profiled(delta_time)
         
-        while self._removal_queue:
-            self._remove(self._removal_queue.popleft())
+        self.commit()
+        self.messages.deliver()
+        if self._drops:
+            self._deliver_drops()
         
         for listener in self._listeners["update"]:
+            if listener is None:
+                continue
+            listener.update(delta_time)
+    
+    def _update_profiled(self, delta_time: float):
+        profiler = self.profiler
+        clock = profiler.clock
+        start = clock()
+        self.commit()
+        profiler.record("commit", start)
+        
+        start = clock()
+        self.messages.deliver()
+        if self._drops:
+            self._deliver_drops()
+        profiler.record("messages", start)
+        
+        start = clock()
+        for listener in self._listeners["update"]:
+            if listener is None:
+                continue
+            listener_start = clock()
             listener.update(delta_time)
+            profiler.record_listener("update", type(listener), clock() - listener_start)
+        profiler.record("update", start)
+    
+    async def async_update(self, delta_time: float, timeout: Optional[float] = None):
+        """Runs the 'async_update' coroutines of the listeners concurrently,
+        and waits for them for at most 'timeout' seconds. An update which
+        takes longer keeps running, and its entity is not updated again until
+        it has finished."""
+        import asyncio
+        if self.paused or not self.enabled:
+            return
+        tasks = self._async_tasks
+        for listener in self._listeners["async_update"]:
+            if listener is None:
+                continue
+            if listener not in tasks:
+                tasks[listener] = asyncio.ensure_future(listener.async_update(delta_time))
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(list(tasks.values()), timeout=timeout)
+        self.async_timeouts += len(pending)
+        for entity, task in list(tasks.items()):
+            if task.done():
+                del tasks[entity]
+                # Raises the exception of a failed update
+                task.result()
+    
+    async def cancel_async_updates(self):
+        """Cancels the running async updates, and waits for them to end."""
+        import asyncio
+        tasks = list(self._async_tasks.values())
+        self._async_tasks.clear()
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
     
-    def draw(self, renderer: Renderer):
-        """Called when it is time to render the frame."""
-        with renderer.offset_context(self.x, self.y, force=True):
+    def interpolate(self, alpha: float):
+        """Called before drawing when running with a fixed timestep, with how
+        far the time has come towards the next update, from 0 to 1, so that
+        entities can draw themselves between their previous and current
+        states."""
+        if self.paused or not self.enabled:
+            return
+        for listener in self._listeners["interpolate"]:
+            if listener is None:
+                continue
+            listener.interpolate(alpha)
+    
+    def draw(self, renderer: Renderer, ox: Optional[int] = None, oy: Optional[int] = None) -> bool:
+        """Called when it is time to render the frame.
+        Entities with bounds outside of the viewport are not drawn, if a
+        viewport is set. Returns whether anything was drawn.
+        Entities are given the cached position of the group on the screen
+        as their offset, which they apply themselves, and the offset given
+        when the group is drawn by a parent group is ignored.
+        With a profiler, the draw phase is always timed, but the time of
+        each entity class is only recorded without a viewport, display lists
+        or dirty rendering."""
+        if not self.enabled:
+            return False
+        profiler = self.profiler
+        if profiler is not None:
+            start = profiler.clock()
+            # Only the plain path times each entity, so that profiling
+            # measures the same draw path as without it
+            if (self._dirty_rendering or self.viewport is not None
+                    or self._display_lists is not None):
+                drawn = self._draw(renderer)
+            else:
+                drawn = self._draw_profiled(renderer)
+            profiler.record("draw", start)
+            return drawn
+        
+        return self._draw(renderer)
+    
+    def _draw_profiled(self, renderer: Renderer) -> bool:
+        """Draws every entity, and records the time spent on each."""
+        profiler = self.profiler
+        clock = profiler.clock
+        drawn = 0
+        wx, wy = self.world_position()
+        for layer in self._layers:
+            drawables = self._drawables[layer]
+            for entity in drawables:
+                if entity is not None:
+                    start = clock()
+                    entity.draw(renderer, wx, wy)
+                    profiler.record_listener("draw", type(entity), clock() - start)
+            drawn += len(drawables) - self._tombstones[layer]
+        self.drawn_count = drawn
+        self.culled_count = 0
+        self.skipped_count = 0
+        return True
+    
+    def _draw(self, renderer: Renderer) -> bool:
+        if self._dirty_rendering:
+            return self._draw_dirty(renderer)
+        if self._display_lists is not None and self.viewport is None:
+            return self._draw_display_lists(renderer)
+        
+        viewport = self.viewport
+        drawn = 0
+        culled = 0
+        wx, wy = self.world_position()
+        if viewport is None:
+            for layer in self._layers:
+                drawables = self._drawables[layer]
+                for entity in drawables:
+                    if entity is not None:
+                        entity.draw(renderer, wx, wy)
+                drawn += len(drawables) - self._tombstones[layer]
+        
+        elif self._spatial_index is not None:
+            index = self._spatial_index
+            vx, vy, vw, vh = viewport
+            visible = index.query_rect(vx - wx, vy - wy, vw, vh)
             for layer in self._layers:
                 for entity in self._drawables[layer]:
-                    entity.draw(renderer, self.x, self.y)
+                    if entity is None:
+                        continue
+                    if entity in visible or entity not in index:
+                        entity.draw(renderer, wx, wy)
+                        drawn += 1
+                    else:
+                        culled += 1
+        
+        else:
+            visible = (viewport[0] - wx, viewport[1] - wy, viewport[2], viewport[3])
+            for layer in self._layers:
+                for entity in self._drawables[layer]:
+                    if entity is None:
+                        continue
+                    if _capabilities_of(type(entity))[2] and not overlaps(entity.bounds(), visible):
+                        culled += 1
+                    else:
+                        entity.draw(renderer, wx, wy)
+                        drawn += 1
+        
+        self.drawn_count = drawn
+        self.culled_count = culled
+        self.skipped_count = 0
+        return True
+    
+    def enable_display_lists(self):
+        """Keeps the draw commands of each layer in a retained display list,
+        which is only rebuilt when the layer or the revision of one of its
+        entities changes. Entities describe their commands with a
+        'display_commands' method, and other entities are drawn as usual in
+        their place. Display lists are not used while a viewport is set or
+        with dirty rendering."""
+        global LayerDisplayList
+        from .display_list import LayerDisplayList
+        self._display_lists = {}
+    
+    def set_layer_static(self, layer: int, static: bool = True):
+        """Marks a layer as static, so that its display list is not checked
+        for changes to its entities. It is still rebuilt when entities are
+        added to or removed from it, or when 'invalidate_layer' is called."""
+        assert(self._display_lists is not None)
+        display_list = self._display_lists.setdefault(layer, LayerDisplayList())
+        display_list.static = static
+    
+    def invalidate_layer(self, layer: int):
+        """Makes the display list of the layer be rebuilt before it is drawn
+        again."""
+        self._layer_versions[layer] += 1
+    
+    def _draw_display_lists(self, renderer: Renderer) -> bool:
+        display_lists = self._display_lists
+        versions = self._layer_versions
+        x, y = self.world_position()
+        drawn = 0
+        for layer in self._layers:
+            display_list = display_lists.get(layer)
+            if display_list is None:
+                display_list = display_lists[layer] = LayerDisplayList()
+            if display_list.is_stale(versions[layer]):
+                display_list.rebuild(self._drawables[layer], versions[layer])
+            display_list.submit(renderer, x, y)
+            drawn += len(self._drawables[layer]) - self._tombstones[layer]
+        self.drawn_count = drawn
+        self.culled_count = 0
+        self.skipped_count = 0
+        return True
+    
+    def enable_dirty_rendering(self, background=(255, 255, 255), retained: bool = False):
+        """Skips drawing frames in which nothing in the group changed, and
+        with 'retained' set, only redraws the regions that changed.
+        A drawable entity has changed when the result of its 'bounds' method
+        or its 'revision' attribute differs from when it was last drawn.
+        'retained' must only be set when the renderer draws into a target
+        which keeps its contents between frames, such as a target texture,
+        as the back buffer of a double-buffered window is undefined after
+        presenting. Changed regions are then filled with the background
+        color before the entities in them are redrawn. Otherwise, and while
+        the group contains drawable entities without bounds, the whole group
+        is cleared and redrawn whenever something changed."""
+        global Rect
+        from sdl2 import Rect
+        self._dirty_rendering = True
+        self._retained = retained
+        self.background = background
+        self._drawn.clear()
+        self._redraw_all = True
+    
+    @property
+    def dirty_rendering(self) -> bool:
+        """Whether only changed regions of the group are redrawn."""
+        return self._dirty_rendering
+    
+    def invalidate(self, entity: Optional[Any]=None):
+        """Makes the entity, or the whole group if none is given, be redrawn
+        on the next frame when using dirty rendering."""
+        if entity is None:
+            self._redraw_all = True
+        else:
+            self._invalidate_drawn(entity)
+    
+    def _invalidate_drawn(self, entity: Any):
+        state = self._drawn.pop(entity, None)
+        if state is not None:
+            self._add_dirty(state[0])
+    
+    def _add_dirty(self, bounds: Bounds):
+        self._dirty = bounds if self._dirty is None else union(self._dirty, bounds)
+    
+    def _draw_dirty(self, renderer: Renderer) -> bool:
+        drawn_states = self._drawn
+        states = {}
+        redraw_all = self._redraw_all
+        for layer in self._layers:
+            for entity in self._drawables[layer]:
+                if entity is None:
+                    continue
+                if not _capabilities_of(type(entity))[2]:
+                    redraw_all = True
+                    continue
+                state = (entity.bounds(), getattr(entity, "revision", 0))
+                states[entity] = state
+                old = drawn_states.get(entity)
+                if old != state:
+                    if old is not None:
+                        self._add_dirty(old[0])
+                    self._add_dirty(state[0])
+        
+        self._drawn = states
+        self.culled_count = 0
+        dirty = self._dirty
+        self._dirty = None
+        self._redraw_all = False
+        if not redraw_all and dirty is None:
+            self.drawn_count = 0
+            self.skipped_count = len(states)
+            return False
+        # Without a retained target, the regions which did not change are
+        # not in the back buffer anymore
+        if not self._retained:
+            redraw_all = True
+        
+        if not redraw_all:
+            # Redrawn entities are not clipped, so the region grows until it
+            # contains every entity overlapping it
+            grown = True
+            while grown:
+                grown = False
+                for bounds, _ in states.values():
+                    if overlaps(bounds, dirty) and union(bounds, dirty) != dirty:
+                        dirty = union(bounds, dirty)
+                        grown = True
+        
+        drawn = 0
+        wx, wy = self.world_position()
+        if redraw_all:
+            renderer.clear()
+        else:
+            area = Rect(dirty[0], dirty[1], dirty[2], dirty[3])
+            renderer.c_fill_rect(self.background, area.moved_by(wx, wy))
+        for layer in self._layers:
+            for entity in self._drawables[layer]:
+                if entity is None:
+                    continue
+                if redraw_all or overlaps(states[entity][0], dirty):
+                    entity.draw(renderer, wx, wy)
+                    drawn += 1
+        
+        self.drawn_count = drawn
+        self.skipped_count = len(states) - drawn if not redraw_all else 0
+        return True
     
     def key_pressed(self, event: KeyDown):
         """Called when a key on the keyboard is pressed."""
+        if not self.enabled:
+            return
         for listener in self._listeners["key_pressed"]:
+            if listener is None:
+                continue
             listener.key_pressed(event)
     
     def key_repeated(self, event: KeyDown):
         """Called when a key on the keyboard is held long enough for it to
         start repeating the input. This is called repeatedly after that."""
+        if not self.enabled:
+            return
         for listener in self._listeners["key_repeated"]:
+            if listener is None:
+                continue
             listener.key_repeated(event)
     
     def key_released(self, event: KeyUp):
         """Called when a key on the keyboard is released."""
+        if not self.enabled:
+            return
         for listener in self._listeners["key_released"]:
+            if listener is None:
+                continue
             listener.key_released(event)
     
-    # TODO: Check that this is correct behavior for nested groups
+    def _misses(self, x: int, y: int) -> bool:
+        """Returns whether a pointer event at the given point, relative to the
+        group, can be ignored by the whole group."""
+        if not self.enabled:
+            return True
+        if self.hit_area is None or self._mouse_capture is not None:
+            return False
+        w, h = self.hit_area
+        return not (0 <= x < w and 0 <= y < h)
+    
     def mouse_moved(self, sx: int, sy: int, x: int, y: int, dx: int, dy: int):
         """Called when the mouse is moved.
         'sx' and 'sy' are the 'screen coordinates' (pixels) while 'x' and 'y'
         are the screen coordinates mapped relative to the entity group.
         'dx' and 'dy' are the relative movement of the mouse in pixels on the
         horizontal and vertical axes."""
+        x -= self.x
+        y -= self.y
+        if self._misses(x, y):
+            return
+        if self._spatial_index is not None:
+            for listener in self._pointer_listeners("mouse_moved", x, y):
+                listener.mouse_moved(sx, sy, x, y, dx, dy)
+            return
         for listener in self._listeners["mouse_moved"]:
-            listener.mouse_moved(sx, sy, x-self.x, y-self.y, dx, dy)
+            if listener is None:
+                continue
+            listener.mouse_moved(sx, sy, x, y, dx, dy)
     
     def mouse_pressed(self, sx: int, sy: int, x: int, y: int, button: MouseButton, is_touch: bool):
         """Called when a mouse button is pressed.
         sx and sy are the 'screen coordinates' (pixels) while x and y
         are the screen coordinates mapped relative to the entity group."""
+        x -= self.x
+        y -= self.y
+        if self._misses(x, y):
+            return
+        if self._spatial_index is not None:
+            for listener in self._pointer_listeners("mouse_pressed", x, y):
+                listener.mouse_pressed(sx, sy, x, y, button, is_touch)
+            return
         for listener in self._listeners["mouse_pressed"]:
-            listener.mouse_pressed(sx, sy, x-self.x, y-self.y, button, is_touch)
+            if listener is None:
+                continue
+            listener.mouse_pressed(sx, sy, x, y, button, is_touch)
     
     def mouse_released(self, sx: int, sy: int, x: int, y: int, button: MouseButton, is_touch: bool):
+        x -= self.x
+        y -= self.y
+        if self._misses(x, y):
+            return
+        if self._spatial_index is not None:
+            for listener in self._pointer_listeners("mouse_released", x, y):
+                listener.mouse_released(sx, sy, x, y, button, is_touch)
+            return
         for listener in self._listeners["mouse_released"]:
-            listener.mouse_released(sx, sy, x-self.x, y-self.y, button, is_touch)
+            if listener is None:
+                continue
+            listener.mouse_released(sx, sy, x, y, button, is_touch)
     
     def mouse_scrolled(self, dx: int, dy: int, direction: int):
+        if not self.enabled:
+            return
         for listener in self._listeners["mouse_scrolled"]:
+            if listener is None:
+                continue
             listener.mouse_scrolled(dx, dy, direction)
     
     def text_input(self, text: str):
+        if not self.enabled:
+            return
         for listener in self._listeners["text_input"]:
+            if listener is None:
+                continue
             listener.text_input(text)
     
     def directory_dropped(self, path: str):
         for listener in self._listeners["directory_dropped"]:
+            if listener is None:
+                continue
             listener.directory_dropped(path)
     
     def file_dropped(self, path: str):
-        for listener in self._listeners["mouse_moved"]:
+        for listener in self._listeners["file_dropped"]:
+            if listener is None:
+                continue
             listener.file_dropped(path)
     
     def quit(self):
+        """Called when the application is asked to close. Returns True if a
+        listener aborted the shutdown, and otherwise sets 'quit_requested',
+        which ends the main loops."""
         for entity in self._listeners["quit"]:
+            if entity is None:
+                continue
             abort_shutdown = entity.quit()
             if abort_shutdown:
                 return True
         
+        self.quit_requested = True
         return False
     
     def handle(self, event: Event):
-        t = type(event)
-        if t == Quit:
-            self.quit()
-        
-        elif t == KeyDown:
-            event = cast(KeyDown, event)
-            if event.repeat:
-                self.key_repeated(event)
-            else:
-                self.key_pressed(event)
-        
-        elif t == KeyUp:
-            event = cast(KeyUp, event)
-            self.key_released(event)
-        
-        elif t == MouseButtonDown:
-            event = cast(MouseButtonDown, event)
-            self.mouse_pressed(event.x, event.y, event.x, event.y, event.button, False)
-        
-        elif t == MouseButtonUp:
-            event = cast(MouseButtonUp, event)
-            self.mouse_released(event.x, event.y, event.x, event.y, event.button, False)
-        
-        elif t == MouseMotion:
-            event = cast(MouseMotion, event)
-            self.mouse_moved(event.x, event.y, event.x, event.y, event.xrel, event.yrel)
-        
-        elif t == MouseWheel:
-            event = cast(MouseWheel, event)
-            self.mouse_scrolled(event.x, event.y, event.direction)
-        
-        elif t == TextInput:
-            event = cast(TextInput, event)
-            self.text_input(event.text)
+        """Sends the event to the listeners of its type."""
+        handler = (_EVENT_HANDLERS or _load_event_handlers()).get(type(event))
+        if handler is not None:
+            handler(self, event)
+    
+    def handle_events(self, events: Iterable[Event], coalesce: bool = False):
+        """Sends the events to the listeners of their types.
+        With 'coalesce' set, consecutive mouse motions are merged into one,
+        with their relative movements summed, and so are consecutive mouse
+        wheel events in the same direction."""
+        handlers = _EVENT_HANDLERS or _load_event_handlers()
+        if not coalesce:
+            for event in events:
+                handler = handlers.get(type(event))
+                if handler is not None:
+                    handler(self, event)
+            return
+        mouse_motion = _MOUSE_MOTION
+        mouse_wheel = _MOUSE_WHEEL
+        motion = None # [x, y, xrel, yrel]
+        wheel = None # [x, y, direction]
+        for event in events:
+            t = type(event)
+            if t is mouse_motion:
+                if wheel is not None:
+                    self.mouse_scrolled(*wheel)
+                    wheel = None
+                if motion is None:
+                    motion = [event.x, event.y, event.xrel, event.yrel]
+                else:
+                    motion[0] = event.x
+                    motion[1] = event.y
+                    motion[2] += event.xrel
+                    motion[3] += event.yrel
+                continue
+            
+            if motion is not None:
+                x, y, dx, dy = motion
+                self.mouse_moved(x, y, x, y, dx, dy)
+                motion = None
+            if t is mouse_wheel:
+                if wheel is not None and wheel[2] == event.direction:
+                    wheel[0] += event.x
+                    wheel[1] += event.y
+                    continue
+                if wheel is not None:
+                    self.mouse_scrolled(*wheel)
+                wheel = [event.x, event.y, event.direction]
+                continue
+            
+            if wheel is not None:
+                self.mouse_scrolled(*wheel)
+                wheel = None
+            handler = handlers.get(t)
+            if handler is not None:
+                handler(self, event)
         
-        elif t == DropFile:
-            event = cast(DropFile, event)
-            if os.path.isdir(event.file):
-                self.directory_dropped(event.file)
+        if motion is not None:
+            x, y, dx, dy = motion
+            self.mouse_moved(x, y, x, y, dx, dy)
+        if wheel is not None:
+            self.mouse_scrolled(*wheel)
+    
+    def _drop(self, path: str):
+        """Checks whether the dropped path is a directory on a worker thread,
+        as it may be on a slow or network drive. The listeners are called at
+        the beginning of the next call to 'update', in the order of the drops."""
+        if self._drop_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._drop_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dalgi-drop")
+        self._drops.append((path, self._drop_executor.submit(os.path.isdir, path)))
+    
+    def _deliver_drops(self):
+        drops = self._drops
+        while drops and drops[0][1].done():
+            path, is_dir = drops.popleft()
+            if is_dir.result():
+                self.directory_dropped(path)
             else:
-                self.file_dropped(event.file)
-        
-        
-        
-    
\ No newline at end of file
+                self.file_dropped(path)
+
+def _handle_key_down(group: EntityGroup, event: KeyDown):
+    if event.repeat:
+        group.key_repeated(event)
+    else:
+        group.key_pressed(event)
+
+# {event type: handler(group, event)}, filled on first use
+_EVENT_HANDLERS = {}
+_MOUSE_MOTION = None
+_MOUSE_WHEEL = None
+
+def _load_event_handlers() -> dict:
+    global _MOUSE_MOTION, _MOUSE_WHEEL
+    from sdl2.events import Quit, KeyDown, KeyUp, MouseButtonDown, MouseButtonUp
+    from sdl2.events import MouseMotion, MouseWheel, TextInput, DropFile
+    _EVENT_HANDLERS.update({
+        Quit: lambda group, event: group.quit(),
+        KeyDown: _handle_key_down,
+        KeyUp: lambda group, event: group.key_released(event),
+        MouseButtonDown: lambda group, event: group.mouse_pressed(
+            event.x, event.y, event.x, event.y, event.button, False
+        ),
+        MouseButtonUp: lambda group, event: group.mouse_released(
+            event.x, event.y, event.x, event.y, event.button, False
+        ),
+        MouseMotion: lambda group, event: group.mouse_moved(
+            event.x, event.y, event.x, event.y, event.xrel, event.yrel
+        ),
+        MouseWheel: lambda group, event: group.mouse_scrolled(event.x, event.y, event.direction),
+        TextInput: lambda group, event: group.text_input(event.text),
+        DropFile: lambda group, event: group._drop(event.file),
+    })
+    _MOUSE_MOTION = MouseMotion
+    _MOUSE_WHEEL = MouseWheel
+    return _EVENT_HANDLERS
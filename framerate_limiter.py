@@ -1,21 +1,45 @@
+from collections import deque
 import time
 
 class FramerateLimiter:
     """A simple timer which can ensure that something runs at a fixed rate"""
-    def __init__(self, max_fps):
+    # Sleeping is only accurate to about a millisecond, so the last part of
+    # each frame is spent spinning instead
+    SPIN_TIME = 0.002
+    
+    def __init__(self, max_fps, history=240):
         self.period = 1.0/max_fps
         self.prev = time.perf_counter()
-        self.times = []
+        self.deadline = self.prev + self.period
+        self.times = deque(maxlen=history)
 
     def tick(self):
-        """Advances the timer by one frame, potentially sleeping until it is time for the next"""
+        """Advances the timer by one frame, potentially sleeping until it is time for the next.
+        Returns the duration of the frame, including the wait."""
+        remaining = self.deadline - time.perf_counter()
+        if remaining > self.SPIN_TIME:
+            time.sleep(remaining - self.SPIN_TIME)
+        while time.perf_counter() < self.deadline:
+            pass
+        
         now = time.perf_counter()
         delta = now - self.prev
         self.times.append(delta)
-        if delta < self.period:
-            time.sleep(self.period - delta)
-        self.prev = time.perf_counter()
+        self.prev = now
+        # Keep to the schedule, unless the frame was so late that catching up
+        # would mean running several frames back to back
+        self.deadline += self.period
+        if self.deadline < now:
+            self.deadline = now + self.period
+        return delta
+
+    def average_frame_time(self):
+        """Returns the average duration of the frames in the history"""
+        if not self.times:
+            return 0.0
+        return sum(self.times) / len(self.times)
 
     def reset(self):
         """Resets the elapsed period of the timer"""
-        self.prev = time.perf_counter()
\ No newline at end of file
+        self.prev = time.perf_counter()
+        self.deadline = self.prev + self.period
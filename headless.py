@@ -0,0 +1,133 @@
+from array import array
+from contextlib import contextmanager
+
+# Opcodes of the recorded draw commands
+CLEAR = 0
+PRESENT = 1
+COPY = 2
+COPY_EX = 3
+FILL_RECT = 4
+OFFSET = 5
+
+# Every command is recorded as this many integers, padded with zeroes:
+# opcode, texture or color, x, y, w, h, extra
+COMMAND_SIZE = 7
+
+class HeadlessTexture:
+    """A texture which only has a size."""
+    def __init__(self, renderer, id, width, height):
+        self.renderer = renderer
+        self.id = id
+        self.width = width
+        self.height = height
+        self.destroyed = False
+
+    def rect_at(self, x, y):
+        return (x, y, self.width, self.height)
+
+    def destroy(self):
+        assert(not self.destroyed)
+        self.destroyed = True
+        self.renderer.textures_destroyed += 1
+
+class HeadlessSurface:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+class HeadlessFont:
+    """A monospaced font which renders every character as a box of the given
+    size."""
+    def __init__(self, size=16, advance=None):
+        self.size_px = size
+        self.advance = advance if advance is not None else size // 2
+
+    def render_blended(self, text, color):
+        return HeadlessSurface(self.advance * len(text), self.size_px)
+
+    def size(self, text):
+        return (self.advance * len(text), self.size_px)
+
+    def line_skip(self):
+        return self.size_px + self.size_px // 4
+
+def _rect(rect):
+    """Returns the (x, y, w, h) of a Rect or tuple, or zeroes for None."""
+    if rect is None:
+        return (0, 0, 0, 0)
+    if type(rect) is tuple:
+        return rect
+    return (rect.x, rect.y, rect.w, rect.h)
+
+def _color(color):
+    r, g, b = color[:3]
+    return (r << 16) | (g << 8) | b
+
+class HeadlessRenderer:
+    """A stand-in for the SDL2 renderer which records draw calls into a
+    compact command buffer instead of drawing, so that scenes can be run and
+    measured without a display.
+    The commands of the current frame are in 'commands', COMMAND_SIZE
+    integers each, and are discarded when the frame is presented unless
+    'keep_frames' is set."""
+    def __init__(self, texture_size=(32, 32), keep_frames=False):
+        self.texture_size = texture_size
+        self.keep_frames = keep_frames
+        self.commands = array("l")
+        self.frames = 0
+        self.commands_per_frame = 0
+        self.textures_created = 0
+        self.textures_destroyed = 0
+        self.offset = (0, 0)
+        self.clear_color = (0, 0, 0)
+
+    def _record(self, opcode, arg, rect, extra=0):
+        x, y, w, h = _rect(rect)
+        self.commands.extend((opcode, arg, x, y, w, h, extra))
+
+    @property
+    def command_count(self):
+        return len(self.commands) // COMMAND_SIZE
+
+    def set_clear_color(self, r, g, b):
+        self.clear_color = (r, g, b)
+
+    def clear(self):
+        self._record(CLEAR, 0, None)
+
+    def present(self):
+        self._record(PRESENT, 0, None)
+        self.frames += 1
+        self.commands_per_frame = self.command_count
+        if not self.keep_frames:
+            del self.commands[:]
+
+    def _new_texture(self, width, height):
+        self.textures_created += 1
+        return HeadlessTexture(self, self.textures_created, width, height)
+
+    def load_texture(self, path):
+        return self._new_texture(*self.texture_size)
+
+    def create_texture_from_surface(self, surface):
+        return self._new_texture(surface.width, surface.height)
+
+    def copy(self, texture, src_rect=None, dst_rect=None):
+        self._record(COPY, texture.id, dst_rect)
+
+    def copy_ex(self, texture, src_rect, dst_rect, angle=0, flip_hor=False, flip_ver=False):
+        flips = (1 if flip_hor else 0) | (2 if flip_ver else 0)
+        self._record(COPY_EX, texture.id, dst_rect, (int(angle) << 2) | flips)
+
+    def c_fill_rect(self, color, rect):
+        self._record(FILL_RECT, _color(color), rect)
+
+    @contextmanager
+    def offset_context(self, x, y, force=False):
+        previous = self.offset
+        self.offset = (x, y) if force else (previous[0] + x, previous[1] + y)
+        self._record(OFFSET, 0, (self.offset[0], self.offset[1], 0, 0))
+        try:
+            yield
+        finally:
+            self.offset = previous
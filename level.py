@@ -1,33 +1,109 @@
-import ftoml as toml
+from __future__ import annotations
+from typing import Iterator, TYPE_CHECKING
+import time
 
-from .resources import Resources
-from .entity_group import EntityGroup
+from .entity_group import EntityGroup, DEFAULT_DRAW_LAYER
+from .toml_cache import load_toml
+
+if TYPE_CHECKING:
+    from .resources import Resources
+
+def _construct(ent: dict, resources: Resources, constructors):
+    t = ent["type"]
+    if t not in constructors:
+        raise ValueError("Class {!r} not found!".format(t))
+    constructor = constructors[t]
+    if type(constructor) is not type:
+        raise TypeError("{!r} ({}) is not a valid constructor!".format(
+            t, type(constructor)
+        ))
+    x, y = ent["pos"]
+    return constructor(x, y, resources)
+
+def _add_entities(group: EntityGroup, ents: list, resources: Resources, constructors):
+    """Constructs the given level entities and adds them to the group."""
+    added = {} # {entity: draw_layer} in file order
+    tagged = []
+    for ent in ents:
+        entity = _construct(ent, resources, constructors)
+        added[entity] = ent.get("layer", DEFAULT_DRAW_LAYER)
+        if "tags" in ent:
+            tagged.append((entity, ent["tags"]))
+    
+    group.add_to_layers(added)
+    
+    for entity, tags in tagged:
+        group.add_tags(entity, *tags)
 
 def load_level(level: str, group: EntityGroup, resources: Resources, constructors):
-    """Loads the level in the given file into the given group"""
-    with open(level) as f:
-        data = toml.loads(f.read())
+    """Loads the level in the given file into the given group.
+    The textures of the resources of the level are acquired for it, until
+    'unload_level' is called."""
+    data = load_toml(level)
     
     for resource_file in data.get("resources", []):
         print("Loading resource {!r}".format(resource_file))
-        resources.load(resource_file+".toml")
-    
-    for ent in data.get("entities", []):
-        t = ent["type"]
-        if t not in constructors:
-            raise ValueError("Class {!r} not found!".format(t))
-        constructor = constructors[t]
-        if type(constructor) is not type:
-            raise TypeError("{!r} ({}) is not a valid constructor!".format(
-                t, type(constructor)
-            ))
-        x, y = ent["pos"]
-        entity = constructor(x, y, resources)
-        if "layer" in ent:
-            group.add(entity, draw_layer=ent["layer"])
-        else:
-            group.add(entity)
-        
-        if "tags" in ent:
-            group.add_tags(entity, *ent["tags"])
-            
\ No newline at end of file
+        resources.load(resource_file+".toml", owner=level)
+    
+    _add_entities(group, data.get("entities", []), resources, constructors)
+
+def stream_level(level: str, group: EntityGroup, resources: Resources, constructors,
+        chunk_size: int = 256) -> Iterator[float]:
+    """Loads the level in the given file into the given group in steps,
+    yielding the progress from 0 to 1 after each step.
+    Images are decoded on worker threads while textures that are ready are
+    uploaded, after which the entities are added 'chunk_size' at a time.
+    When the group is already initialized, each chunk is added and
+    initialized at the next commit of the group."""
+    data = load_toml(level)
+    for resource_file in data.get("resources", []):
+        print("Loading resource {!r}".format(resource_file))
+        resources.load(resource_file+".toml", background=True, owner=level)
+    
+    ents = data.get("entities", [])
+    textures = resources.pending_count
+    total = textures + len(ents)
+    if total == 0:
+        yield 1.0
+        return
+    
+    # Entities may look up sprites when constructed, so wait for all of them
+    while resources.pending_count:
+        resources.upload_pending(budget=0)
+        yield (textures - resources.pending_count) / total
+    resources.upload_pending()
+    
+    for start in range(0, len(ents), chunk_size):
+        _add_entities(group, ents[start:start+chunk_size], resources, constructors)
+        yield (textures + min(start + chunk_size, len(ents))) / total
+
+def unload_level(level: str, resources: Resources):
+    """Releases the textures acquired for the level, so that they can be
+    evicted once the texture budget of the resources is exceeded."""
+    resources.release(level)
+
+class LevelLoader:
+    """Loads a level over several frames, spending at most about 'budget'
+    seconds of each frame on it."""
+    def __init__(self, level: str, group: EntityGroup, resources: Resources, constructors,
+            budget: float = 0.004, chunk_size: int = 64):
+        self.budget = budget
+        self.progress = 0.0
+        self.done = False
+        self._steps = stream_level(level, group, resources, constructors, chunk_size)
+    
+    def step(self) -> float:
+        """Advances the loading until the budget of this frame is spent, and
+        returns the progress from 0 to 1."""
+        if self.done:
+            return self.progress
+        start = time.perf_counter()
+        for progress in self._steps:
+            # No progress means it is waiting for images to be decoded
+            waiting = progress == self.progress
+            self.progress = progress
+            if waiting or time.perf_counter() - start >= self.budget:
+                return progress
+        self.progress = 1.0
+        self.done = True
+        return self.progress
@@ -7,7 +7,7 @@ def main():
         rect = ColorRect((255, 0, 0), Rect(300, 0, 200, 10))
         fontpath = "/System/Library/Fonts/HelveticaNeueDeskInterface.ttc"
         font = Font.load(fontpath, 16)
-        text = Label(10, 10, "Hello World", font, renderer)
+        text = Label(10, 10, "Hello World", font, renderer, glyph_atlas=True)
         r_angle = Ref(val=None)
         def angle_callback(angle):
             if r_angle.val is None:
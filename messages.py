@@ -0,0 +1,138 @@
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+Message = Union[str, int]
+
+class MessageBus:
+    """Sends messages from entities to the handlers connected to them.
+    Each message name is given an integer channel ID when first used, and
+    the handlers of a channel are compiled into a tuple, which is rebuilt
+    only when a connection changes."""
+    def __init__(self):
+        self._ids = {} # {name: channel}
+        self._names = [] # [name]
+        self._registered = [] # [bool]
+        self._handlers = [] # [{entity: [handler]}]
+        self._compiled = [] # [tuple of handlers, or None when outdated]
+        self._connections = {} # {entity: {channel}}
+        self._queue = [] # [(channel, args)]
+        self._queued = set() # {(channel, args)} of hashable queued messages
+        self.sends = [] # [int]
+        self.handler_time = [] # [seconds], only measured when 'timed' is set
+        self.timed = False
+
+    def channel(self, message: Message) -> int:
+        """Returns the channel ID of the message."""
+        if type(message) is int:
+            return message
+        channel = self._ids.get(message)
+        if channel is None:
+            channel = self._ids[message] = len(self._names)
+            self._names.append(message)
+            self._registered.append(False)
+            self._handlers.append({})
+            self._compiled.append(())
+            self.sends.append(0)
+            self.handler_time.append(0.0)
+        return channel
+
+    def register(self, *messages: str) -> Tuple[int, ...]:
+        """Registers the messages, and returns their channel IDs."""
+        channels = tuple(self.channel(message) for message in messages)
+        for channel in channels:
+            self._registered[channel] = True
+        return channels
+
+    def connect(self, entity: Any, message: Message, handler: Callable):
+        """Connects a handler of the entity to the message. An entity may
+        connect several handlers to the same message."""
+        channel = self.channel(message)
+        self._handlers[channel].setdefault(entity, []).append(handler)
+        self._compiled[channel] = None
+        self._connections.setdefault(entity, set()).add(channel)
+
+    def disconnect(self, entity: Any):
+        """Disconnects every handler of the entity."""
+        for channel in self._connections.pop(entity, ()):
+            del self._handlers[channel][entity]
+            self._compiled[channel] = None
+
+    def _compile(self, channel: int) -> tuple:
+        handlers = tuple(h for hs in self._handlers[channel].values() for h in hs)
+        self._compiled[channel] = handlers
+        return handlers
+
+    def send(self, message: Message, *args):
+        """Calls the handlers of the message immediately."""
+        channel = message if type(message) is int else self._ids[message]
+        assert(self._registered[channel])
+        handlers = self._compiled[channel]
+        if handlers is None:
+            handlers = self._compile(channel)
+        self.sends[channel] += 1
+        if not self.timed:
+            for handler in handlers:
+                handler(*args)
+            return
+        start = time.perf_counter()
+        for handler in handlers:
+            handler(*args)
+        self.handler_time[channel] += time.perf_counter() - start
+
+    def post(self, message: Message, *args):
+        """Queues the message until 'deliver' is called. A message with the
+        same arguments as one that is already queued is dropped."""
+        channel = message if type(message) is int else self._ids[message]
+        assert(self._registered[channel])
+        key = (channel, args)
+        try:
+            if key in self._queued:
+                return
+            self._queued.add(key)
+        except TypeError:
+            # Unhashable arguments can not be coalesced
+            pass
+        self._queue.append(key)
+
+    def deliver(self) -> int:
+        """Sends the queued messages, in the order they were first posted.
+        Messages posted by the handlers are delivered at the next call.
+        Returns the number of messages sent."""
+        queue = self._queue
+        if not queue:
+            return 0
+        self._queue = []
+        self._queued = set()
+        send = self.send
+        for channel, args in queue:
+            send(channel, *args)
+        return len(queue)
+
+    def validate(self, ignore: Optional[set] = None):
+        """Raises an exception if messages have been connected to without
+        being registered, or are registered but unused."""
+        if ignore is None:
+            ignore = set()
+        unused = []
+        unregistered = []
+        for channel, name in enumerate(self._names):
+            if not self._registered[channel]:
+                unregistered.append(name)
+                continue
+            if not self._handlers[channel]:
+                if name in ignore:
+                    continue
+                unused.append(name)
+
+        if unused or unregistered:
+            raise Exception("Unregistered message(s): {}, Unused message type(s): {}".format(
+                unregistered, unused
+            ))
+
+    def stats(self) -> Dict[str, dict]:
+        """Returns the number of sends and the time spent in handlers for
+        each message."""
+        return {
+            name: {"sends": self.sends[channel], "handler_time": self.handler_time[channel]}
+            for channel, name in enumerate(self._names)
+        }
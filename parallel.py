@@ -0,0 +1,221 @@
+"""Runs the updates of independent entity groups in worker processes.
+Each independent group is built inside a worker by a factory function,
+which must be defined at the top level of a module so that it can be sent
+to the worker, and which must make a component store in the group:
+    def build_arena(group, index):
+        store = group.create_component_store(1000)
+        ...
+The worker copies the store into shared memory after each update, from
+where the main process draws it, so the main process only renders."""
+from array import array
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+import os
+import traceback
+from typing import Callable, List, Optional
+
+SHARED_COLUMNS = ("x", "y", "rotation", "sprite")
+# Sprite IDs are stored as 'q' and the other columns as 'd', which have
+# the same size on every platform
+ITEM_SIZE = array("d").itemsize
+assert(array("q").itemsize == ITEM_SIZE)
+HEADER_SIZE = 2 * ITEM_SIZE # The frame number and the entity count
+
+def _buffer_size(capacity: int) -> int:
+    return HEADER_SIZE + capacity * ITEM_SIZE * len(SHARED_COLUMNS)
+
+class _SharedColumns:
+    """Views of the two buffers of one group in shared memory. The worker
+    writes frame N into buffer N % 2 while the other one may be drawn."""
+    def __init__(self, buf: memoryview, capacity: int):
+        self.capacity = capacity
+        self.buffers = [] # [(header, {column name: view})]
+        size = _buffer_size(capacity)
+        for base in (0, size):
+            header = buf[base:base + HEADER_SIZE].cast("q")
+            columns = {}
+            offset = base + HEADER_SIZE
+            for name in SHARED_COLUMNS:
+                end = offset + capacity * ITEM_SIZE
+                columns[name] = buf[offset:end].cast("q" if name == "sprite" else "d")
+                offset = end
+            self.buffers.append((header, columns))
+
+    def write(self, frame: int, store):
+        n = store.count
+        if n > self.capacity:
+            raise ValueError("{} entities do not fit in a shared buffer of {}".format(
+                n, self.capacity
+            ))
+        header, columns = self.buffers[frame % 2]
+        for name in SHARED_COLUMNS:
+            # NumPy reports int64 as 'l', so the source is cast to the
+            # format of the shared view
+            view = columns[name]
+            view[:n] = memoryview(store.columns[name]).cast("B").cast(view.format)[:n]
+        header[0] = frame
+        header[1] = n
+
+    def release(self):
+        for header, columns in self.buffers:
+            header.release()
+            for view in columns.values():
+                view.release()
+        self.buffers = []
+
+def _worker(connection, specs):
+    """Builds the groups of the specs, and updates them whenever a frame is
+    received, until None is."""
+    from dalgi.entity_group import EntityGroup
+    groups = [] # [(group, _SharedColumns, SharedMemory)]
+    try:
+        for index, factory, name, capacity in specs:
+            shm = SharedMemory(name=name)
+            group = EntityGroup()
+            factory(group, index)
+            if group.components is None:
+                raise ValueError("The factory of independent group {} made no component store".format(index))
+            group.init()
+            groups.append((group, _SharedColumns(shm.buf, capacity), shm))
+        connection.send((0, None))
+        while True:
+            message = connection.recv()
+            if message is None:
+                break
+            frame, delta_time = message
+            for group, columns, _ in groups:
+                group.update(delta_time)
+                columns.write(frame, group.components)
+            connection.send((frame, None))
+    except Exception:
+        connection.send((-1, traceback.format_exc()))
+    finally:
+        for _, columns, shm in groups:
+            columns.release()
+            shm.close()
+
+class SharedStoreView:
+    """Draws the entities of an independent group from shared memory, as of
+    the last finished update, using the draw functions in 'sprites' indexed
+    by sprite ID."""
+    def __init__(self, updater: "ParallelUpdater", columns: _SharedColumns, sprites: List[Callable]):
+        self.updater = updater
+        self.columns = columns
+        self.sprites = sprites
+
+    def draw(self, renderer, ox, oy):
+        frame = self.updater.frame_done
+        if frame == 0:
+            return
+        header, columns = self.columns.buffers[frame % 2]
+        n = header[1]
+        xs = columns["x"][:n].tolist()
+        ys = columns["y"][:n].tolist()
+        rotations = columns["rotation"][:n].tolist()
+        sprite_ids = columns["sprite"][:n].tolist()
+        sprites = self.sprites
+        for i in range(n):
+            sprites[sprite_ids[i]](xs[i] + ox, ys[i] + oy, rotations[i])
+
+class ParallelUpdater:
+    """Updates independent groups in worker processes. Add it to the group
+    of the main loop, so that its 'update' steps every independent group,
+    and add the views made by 'view' to draw them.
+    Every group is updated once per frame with the same delta time, and a
+    frame is only drawn once all groups have finished it, so the results do
+    not depend on the number of processes. With 'pipelined' set, 'update'
+    returns as soon as the next frame has been started, and the previous
+    frame is drawn while the workers compute it."""
+    def __init__(self, factories: List[Callable], processes: Optional[int] = None,
+            capacity: int = 4096, pipelined: bool = False):
+        if processes is None:
+            processes = os.cpu_count() or 1
+        processes = max(1, min(processes, len(factories)))
+        self.pipelined = pipelined
+        self.frame = 0 # The last started frame
+        self.frame_done = 0 # The last finished frame
+        self._memory = []
+        self._columns = []
+        self._connections = []
+        self._processes = []
+        context = multiprocessing.get_context("spawn")
+        specs = [[] for _ in range(processes)]
+        for index, factory in enumerate(factories):
+            shm = SharedMemory(create=True, size=2 * _buffer_size(capacity))
+            self._memory.append(shm)
+            self._columns.append(_SharedColumns(shm.buf, capacity))
+            specs[index % processes].append((index, factory, shm.name, capacity))
+        for worker_specs in specs:
+            parent, child = context.Pipe()
+            process = context.Process(target=_worker, args=(child, worker_specs), daemon=True)
+            process.start()
+            # Only the worker keeps its end open, so that its exit is noticed
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+        self._receive(0)
+
+    def _receive(self, frame: int):
+        for connection in self._connections:
+            try:
+                done, error = connection.recv()
+            except EOFError:
+                done, error = -1, "The worker process exited"
+            if error is not None:
+                self.close()
+                raise Exception("An independent group failed:\n{}".format(error))
+            assert(done == frame)
+
+    def start_update(self, delta_time: float):
+        """Starts updating every group by one frame."""
+        assert(self.frame == self.frame_done)
+        self.frame += 1
+        for connection in self._connections:
+            connection.send((self.frame, delta_time))
+
+    def finish_update(self):
+        """Waits until every group has finished the started frame."""
+        if self.frame != self.frame_done:
+            self._receive(self.frame)
+            self.frame_done = self.frame
+
+    def update(self, delta_time: float):
+        if self.pipelined:
+            self.finish_update()
+            self.start_update(delta_time)
+        else:
+            self.start_update(delta_time)
+            self.finish_update()
+
+    def view(self, index: int, sprites: List[Callable]) -> SharedStoreView:
+        """Returns an entity which draws the independent group with the given
+        index."""
+        return SharedStoreView(self, self._columns[index], sprites)
+
+    def destroy(self):
+        self.close()
+
+    def close(self):
+        """Stops the workers and frees the shared memory."""
+        for connection in self._connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join()
+        for columns in self._columns:
+            columns.release()
+        for shm in self._memory:
+            shm.close()
+            shm.unlink()
+        self._connections = []
+        self._processes = []
+        self._columns = []
+        self._memory = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,175 @@
+from typing import Any, Callable, Dict
+
+class EntityPool:
+    """Keeps preallocated entities of one kind for reuse, so that spawning
+    and removing short-lived entities, such as particles and projectiles,
+    neither allocates nor changes the listener lists of the group.
+    The pool is added to a group like an entity, and calls 'update',
+    'interpolate' and 'draw' on its active entities, which are kept at the
+    front of its list so that inactive ones cost nothing. Other listener
+    methods of pooled entities are not called.
+    The factory must always make the same kind of entity, as which of
+    these methods are called is found out from the first one.
+    Pooled entities may define these hooks:
+    - reset(*args, **kwargs): Called by 'spawn' with its arguments.
+    - activate(): Called by 'spawn' after 'reset'.
+    - deactivate(): Called by 'release'."""
+    def __init__(self, factory: Callable[[], Any], size: int = 0, grow: bool = True):
+        self.factory = factory
+        self.grow = grow
+        self.parent = None
+        self._entities = [] # Active entities, then inactive ones
+        self._slots = {} # {entity: index}
+        self.active_count = 0
+        self._iterating = False
+        self._released = {} # {entity: None} released while iterating
+        # Whether pooled entities have 'update', 'interpolate' and 'draw'
+        self._updates = False
+        self._interpolates = False
+        self._draws = False
+        # Statistics
+        self.spawns = 0
+        self.hits = 0 # Spawns which reused an entity
+        self.allocations = 0 # Entities created after the pool was created
+        self.hits_last_frame = 0
+        self._frame_hits = 0
+        self._allocate(size)
+        self.allocations = 0
+
+    def _allocate(self, count: int):
+        for _ in range(count):
+            entity = self.factory()
+            if not self._entities:
+                self._updates = hasattr(entity, "update")
+                self._interpolates = hasattr(entity, "interpolate")
+                self._draws = hasattr(entity, "draw")
+            self._slots[entity] = len(self._entities)
+            self._entities.append(entity)
+            if self.parent is not None and hasattr(entity, "init"):
+                entity.init(self.parent)
+        self.allocations += count
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    @property
+    def active(self) -> list:
+        """Returns a list of the active entities."""
+        return self._entities[:self.active_count]
+
+    def spawn(self, *args, **kwargs) -> Any:
+        """Activates an inactive entity, and returns it. A new entity is
+        created when all of them are active, unless the pool may not grow, in
+        which case None is returned."""
+        self.spawns += 1
+        if self.active_count == len(self._entities):
+            if not self.grow:
+                return None
+            self._allocate(1)
+        else:
+            self.hits += 1
+            self._frame_hits += 1
+        entity = self._entities[self.active_count]
+        self.active_count += 1
+        reset = getattr(entity, "reset", None)
+        if reset is not None:
+            reset(*args, **kwargs)
+        activate = getattr(entity, "activate", None)
+        if activate is not None:
+            activate()
+        return entity
+
+    def release(self, entity: Any):
+        """Deactivates the entity, so that it can be spawned again. Entities
+        released while the pool is updating or drawing are moved out of the
+        active entities afterwards. Releasing an inactive entity, or one
+        that is already waiting to be moved out, does nothing."""
+        if self._slots[entity] >= self.active_count or entity in self._released:
+            return
+        deactivate = getattr(entity, "deactivate", None)
+        if deactivate is not None:
+            deactivate()
+        if self._iterating:
+            self._released[entity] = None
+        else:
+            self._move_out(entity)
+
+    def _move_out(self, entity: Any):
+        entities = self._entities
+        slots = self._slots
+        index = slots[entity]
+        last = self.active_count - 1
+        if index != last:
+            moved = entities[last]
+            entities[index] = moved
+            entities[last] = entity
+            slots[moved] = index
+            slots[entity] = last
+        self.active_count = last
+
+    def _finish_iterating(self):
+        self._iterating = False
+        if self._released:
+            for entity in self._released:
+                self._move_out(entity)
+            self._released.clear()
+
+    def release_all(self):
+        for entity in self.active:
+            self.release(entity)
+
+    def init(self, parent: Any):
+        self.parent = parent
+        for entity in self._entities:
+            if hasattr(entity, "init"):
+                entity.init(parent)
+
+    def destroy(self):
+        for entity in self._entities:
+            if hasattr(entity, "destroy"):
+                entity.destroy()
+
+    def update(self, delta_time: float):
+        self.hits_last_frame = self._frame_hits
+        self._frame_hits = 0
+        if not self._updates:
+            return
+        entities = self._entities
+        self._iterating = True
+        try:
+            for i in range(self.active_count):
+                entities[i].update(delta_time)
+        finally:
+            self._finish_iterating()
+
+    def interpolate(self, alpha: float):
+        if not self._interpolates:
+            return
+        entities = self._entities
+        for i in range(self.active_count):
+            entities[i].interpolate(alpha)
+
+    def draw(self, renderer, ox, oy):
+        if not self._draws:
+            return
+        entities = self._entities
+        self._iterating = True
+        try:
+            for i in range(self.active_count):
+                entities[i].draw(renderer, ox, oy)
+        finally:
+            self._finish_iterating()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the size of the pool, the number of active entities, the
+        fraction of spawns which reused an entity, the number of entities
+        created after the pool was created, and the number of allocations
+        avoided during the last frame."""
+        return {
+            "size": len(self._entities),
+            "active": self.active_count,
+            "spawns": self.spawns,
+            "hit_rate": self.hits / self.spawns if self.spawns else 1.0,
+            "allocations": self.allocations,
+            "allocations_avoided_last_frame": self.hits_last_frame,
+        }
@@ -0,0 +1,116 @@
+from array import array
+from collections import deque
+import json
+import math
+import time
+from typing import Dict, Optional
+
+class Histogram:
+    """A histogram of durations in logarithmic buckets, which estimates
+    percentiles in a fixed amount of memory."""
+    MIN_TIME = 1e-7 # Durations below this go into the first bucket
+    BUCKETS_PER_DECADE = 20
+    DECADES = 8
+
+    def __init__(self):
+        self.counts = array("L", [0]) * (self.BUCKETS_PER_DECADE * self.DECADES + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration: float):
+        if duration > self.MIN_TIME:
+            bucket = int(math.log10(duration / self.MIN_TIME) * self.BUCKETS_PER_DECADE) + 1
+            if bucket >= len(self.counts):
+                bucket = len(self.counts) - 1
+        else:
+            bucket = 0
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def percentile(self, p: float) -> float:
+        """Returns an estimate of the duration below which p percent of the
+        durations are, accurate to the width of a bucket (about 12%)."""
+        if self.count == 0:
+            return 0.0
+        rank = self.count * p / 100.0
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                if bucket == 0:
+                    return self.MIN_TIME
+                # The upper edge of the bucket
+                return min(self.MIN_TIME * 10 ** (bucket / self.BUCKETS_PER_DECADE), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+class FrameProfiler:
+    """Records how long each phase of a frame, and each listener class in the
+    update and draw phases, takes. Draw listeners are not timed while the
+    group draws from display lists, culls to a viewport or only redraws
+    what changed, as their draws are not made one entity at a time.
+    Set it as the 'profiler' of an entity group to enable it. The main loops
+    in dalgi.utils then also record the events, present and sleep phases.
+    The most recent 'trace_length' timings are kept for 'export_chrome_trace'."""
+    clock = staticmethod(time.perf_counter)
+
+    def __init__(self, trace_length: int = 100000):
+        self.phases = {} # {phase: Histogram}
+        self.listeners = {} # {(category, class name): Histogram}
+        self._trace = deque(maxlen=trace_length) # [(name, start, duration)]
+        self._epoch = time.perf_counter()
+
+    def record(self, phase: str, start: float, end: Optional[float] = None):
+        """Records that the phase ran from 'start' until 'end', or now."""
+        if end is None:
+            end = time.perf_counter()
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            histogram = self.phases[phase] = Histogram()
+        histogram.add(end - start)
+        self._trace.append((phase, start, end - start))
+
+    def record_listener(self, category: str, cls: type, duration: float):
+        key = (category, cls.__name__)
+        histogram = self.listeners.get(key)
+        if histogram is None:
+            histogram = self.listeners[key] = Histogram()
+        histogram.add(duration)
+
+    def report(self) -> Dict[str, dict]:
+        """Returns a summary of every phase and listener, with durations in
+        seconds."""
+        report = {phase: h.summary() for phase, h in self.phases.items()}
+        for (category, name), histogram in self.listeners.items():
+            report["{}:{}".format(category, name)] = histogram.summary()
+        return report
+
+    def export_chrome_trace(self, path: str):
+        """Writes the recorded phases in the Chrome trace event format, which
+        can be opened in chrome://tracing or Perfetto."""
+        events = [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": (start - self._epoch) * 1e6,
+                "dur": duration * 1e6,
+                "pid": 0,
+                "tid": 0,
+            }
+            for name, start, duration in self._trace
+        ]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -1,14 +1,53 @@
-from sdl2 import Rect
-import ftoml as toml
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from sdl2 import Rect, Surface
+from typing import Any, Dict, Optional
+import time
+
+from .atlas import ShelfPacker
+from .toml_cache import load_toml
+
+class _TextureSlot:
+    """The texture of a path, shared by the sprites drawn from it so that
+    they do not look it up on every draw. The texture is None while it is
+    evicted."""
+    __slots__ = ("texture", "released")
+    
+    def __init__(self, texture=None):
+        self.texture = texture
+        self.released = False # Whether every owner released the texture
 
 class Resources:
-    def __init__(self, renderer, scale=1):
+    """Loads textures and declares the sprites drawn from them.
+    Textures loaded from files are reference counted by owner, such as the
+    levels loaded by 'load_level', which acquire the textures of their
+    resource files. Once the textures that all of their owners released
+    take up more than 'budget' bytes, the least recently used of them are
+    destroyed, and are loaded again the next time a sprite of theirs is
+    drawn. Textures which no owner released, including those loaded
+    without an owner, are never evicted."""
+    def __init__(self, renderer, scale=1, budget: Optional[int] = None):
         self._renderer = renderer
-        self._textures = {}
+        self._textures = {} # {texture path: texture} of resident textures
+        self._slots = {} # {texture path: _TextureSlot}
+        self._texture_sizes = {} # {texture path: bytes}
+        self._refs = {} # {texture path: reference count}
+        self._unused = OrderedDict() # {texture path: None} by last use, for eviction
+        self._owned = {} # {owner: [texture path]}
+        self._file_textures = {} # {resource file: [texture path]}
+        self._budget = budget
+        self.resident_bytes = 0
+        self.evictions = 0
+        self.reloads = 0
         self._sprites = {}
         self._scale = scale
         self._loaded_resource_files = set()
         self._loaded_resource_names = set()
+        self._atlases = []
+        self._executor = None
+        self.decode_workers = 4
+        self._decoding = {} # {texture path: future surface}
+        self._pending_sprites = [] # [(name, texture path, rect)]
     
     def declare_simple_sprite(self, name: str, texture_path: str):
         print("Declaring: {} => {!r}".format(name, texture_path))
@@ -17,17 +56,32 @@ class Resources:
     def declare_sprite(self, name: str, texture_path: str, rect: Rect):
         assert(name not in self._sprites)
         
-        if not texture_path in self._textures:
-            self._textures[texture_path] = self._renderer.load_texture(texture_path)
-        
-        texture = self._textures[texture_path]
+        texture = self._texture(texture_path)
+        self._declare_texture_sprite(name, texture, rect, texture_path)
+    
+    def _declare_texture_sprite(self, name: str, texture, rect: Rect, path: Optional[str] = None):
+        """Declares a sprite drawn from the texture. Sprites of textures with
+        a path draw from the slot of the path, as the texture may be evicted
+        and loaded again."""
         # Allow passing a None rect to use the full texture
-        dest = Rect(0, 0, 0, 0).resize(texture.width * self._scale, texture.height * self._scale)
+        if rect is None:
+            width, height = texture.width, texture.height
+        else:
+            width, height = rect.w, rect.h
+        dest = Rect(0, 0, 0, 0).resize(width * self._scale, height * self._scale)
+        slot = self._slot(path) if path is not None else _TextureSlot(texture)
+        unused = self._unused
         def draw_func(x, y, angle=0, flip_hor=False, flip_ver=False):
+            texture = slot.texture
+            if texture is None:
+                texture = self._reload(path)
+            elif slot.released:
+                unused.move_to_end(path)
+            dst = dest.moved_to(int(round(x)), int(round(y)))
             self._renderer.copy_ex(
                 texture,
                 rect, 
-                dest.moved_to(int(round(x)), int(round(y))),
+                dst,
                 angle=angle, 
                 flip_hor=flip_hor, 
                 flip_ver=flip_ver
@@ -35,24 +89,213 @@ class Resources:
         
         self._sprites[name] = draw_func
     
+    def declare_sprite_in_background(self, name: str, texture_path: str, rect: Optional[Rect] = None):
+        """Declares a sprite whose image is read and decoded on a worker
+        thread. The sprite is available once 'upload_pending' has uploaded
+        its texture on the main thread."""
+        assert(name not in self._sprites)
+        if texture_path not in self._textures and texture_path not in self._decoding:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.decode_workers, thread_name_prefix="dalgi-decode"
+                )
+            self._decoding[texture_path] = self._executor.submit(Surface.load, texture_path)
+        self._pending_sprites.append((name, texture_path, rect))
+    
+    @property
+    def pending_count(self) -> int:
+        """The number of textures which are decoding or waiting for upload."""
+        return len(self._decoding)
+    
+    def upload_pending(self, budget: Optional[float] = None) -> int:
+        """Uploads decoded textures on the calling thread, which must be the
+        main thread, and declares the sprites waiting for them.
+        With a budget in seconds, only already decoded textures are uploaded,
+        until the budget is spent. Without one, this waits for every texture.
+        Returns the number of textures which are still pending."""
+        start = time.perf_counter()
+        for path, future in list(self._decoding.items()):
+            if budget is not None and not future.done():
+                continue
+            surface = future.result()
+            self._add_texture(path, self._renderer.create_texture_from_surface(surface))
+            del self._decoding[path]
+            if budget is not None and time.perf_counter() - start >= budget:
+                break
+        
+        waiting = []
+        for name, path, rect in self._pending_sprites:
+            if path in self._textures:
+                self.declare_sprite(name, path, rect)
+            else:
+                waiting.append((name, path, rect))
+        self._pending_sprites = waiting
+        return len(self._decoding)
+    
+    def _texture(self, path: str):
+        """Returns the texture of the path, loading it if it is not resident."""
+        texture = self._textures.get(path)
+        if texture is None:
+            texture = self._add_texture(path, self._renderer.load_texture(path))
+        return texture
+    
+    def _slot(self, path: str) -> _TextureSlot:
+        slot = self._slots.get(path)
+        if slot is None:
+            slot = self._slots[path] = _TextureSlot()
+        return slot
+    
+    def _add_texture(self, path: str, texture):
+        size = texture.width * texture.height * 4
+        self._textures[path] = texture
+        self._texture_sizes[path] = size
+        self.resident_bytes += size
+        slot = self._slot(path)
+        slot.texture = texture
+        if slot.released:
+            self._unused[path] = None
+        self._enforce_budget(keep=path)
+        return texture
+    
+    def _reload(self, path: str):
+        self.reloads += 1
+        return self._texture(path)
+    
+    def _evict(self, path: str):
+        del self._unused[path]
+        self._textures.pop(path).destroy()
+        self._slots[path].texture = None
+        self.resident_bytes -= self._texture_sizes.pop(path)
+        self.evictions += 1
+    
+    def _enforce_budget(self, keep: Optional[str] = None):
+        """Evicts the least recently used released textures until the
+        resident textures fit in the budget."""
+        if self._budget is None:
+            return
+        unused = self._unused
+        while self.resident_bytes > self._budget and unused:
+            path = next(iter(unused))
+            if path == keep:
+                if len(unused) == 1:
+                    break
+                unused.move_to_end(path)
+                continue
+            self._evict(path)
+    
+    @property
+    def budget(self) -> Optional[int]:
+        """The number of bytes of resident textures above which released
+        textures are evicted, or None for no limit."""
+        return self._budget
+    
+    @budget.setter
+    def budget(self, budget: Optional[int]):
+        self._budget = budget
+        self._enforce_budget()
+    
+    def acquire(self, owner: Any, filepath: str):
+        """References the textures of a loaded resource file on behalf of the
+        owner, so that they are not evicted until it releases them. An owner
+        only references each file once."""
+        owned = self._owned.setdefault(owner, [])
+        for path in self._file_textures.get(filepath, ()):
+            if path in owned:
+                continue
+            owned.append(path)
+            self._refs[path] = self._refs.get(path, 0) + 1
+            self._slot(path).released = False
+            self._unused.pop(path, None)
+    
+    def release(self, owner: Any):
+        """Releases the textures referenced by the owner. Textures which are
+        no longer referenced stay resident until the budget is exceeded."""
+        for path in self._owned.pop(owner, ()):
+            self._refs[path] -= 1
+            if self._refs[path] == 0:
+                del self._refs[path]
+                self._slots[path].released = True
+                if path in self._textures:
+                    self._unused[path] = None
+        self._enforce_budget()
+    
+    def cache_stats(self) -> Dict[str, int]:
+        """Returns the number and bytes of resident textures, how many of
+        them were released and can be evicted, and the number of evictions
+        and reloads."""
+        return {
+            "textures": len(self._textures),
+            "resident_bytes": self.resident_bytes,
+            "evictable": len(self._unused),
+            "evictions": self.evictions,
+            "reloads": self.reloads,
+        }
+    
+    def declare_atlas_sprites(self, sprites: dict, page_size: int = 2048):
+        """Declares the given {name: texture path} sprites, packing the images
+        into as few atlas textures as possible. Atlas textures are never
+        evicted."""
+        for name in sprites:
+            assert(name not in self._sprites)
+        surfaces = {path: Surface.load(path) for path in set(sprites.values())}
+        paths = list(surfaces)
+        packer = ShelfPacker(page_size)
+        placements = packer.pack([(surfaces[p].width, surfaces[p].height) for p in paths])
+        
+        pages = [Surface.blank(width, height) for width, height in packer.page_sizes()]
+        rects = {}
+        for path, (page, x, y) in zip(paths, placements):
+            surface = surfaces[path]
+            rects[path] = (page, Rect(x, y, surface.width, surface.height))
+            pages[page].blit(surface, rects[path][1])
+        
+        textures = [self._renderer.create_texture_from_surface(page) for page in pages]
+        self._atlases.extend(textures)
+        for name, path in sprites.items():
+            print("Declaring: {} => {!r} (atlas)".format(name, path))
+            page, rect = rects[path]
+            self._declare_texture_sprite(name, textures[page], rect)
+    
     def draw_function(self, sprite_name: str):
         assert(sprite_name in self._sprites)
         return self._sprites[sprite_name]
     
-    def load(self, filepath: str):
-        """Loads the resources specified in the given TOML file"""
-        if filepath in self._loaded_resource_files: return
-        with open(filepath, "r") as f:
-            data = toml.loads(f.read())
+    def load(self, filepath: str, atlas: bool = False, background: bool = False,
+            owner: Any = None):
+        """Loads the resources specified in the given TOML file.
+        If 'atlas' is set, the simple sprites are packed into atlas textures.
+        Otherwise, if 'background' is set, the images are decoded on worker
+        threads, and 'upload_pending' must be called to finish loading.
+        With an owner, the textures of the file are acquired for it."""
+        if filepath in self._loaded_resource_files:
+            if owner is not None:
+                self.acquire(owner, filepath)
+            return
+        data = load_toml(filepath)
         
         # TODO: validate the TOML structure
         
         resource_name = data["name"]
         assert(resource_name not in self._loaded_resource_names)
         if "simple" in data:
-            for name, path in data["simple"].items():
-                name = "{}/{}".format(resource_name, name)
-                self.declare_simple_sprite(name, path)
+            sprites = {
+                "{}/{}".format(resource_name, name): path
+                for name, path in data["simple"].items()
+            }
+            if not atlas:
+                # Acquired before loading, so that they are not evicted
+                # while the rest of the file loads
+                self._file_textures[filepath] = list(dict.fromkeys(sprites.values()))
+                if owner is not None:
+                    self.acquire(owner, filepath)
+            if atlas:
+                self.declare_atlas_sprites(sprites)
+            elif background:
+                for name, path in sprites.items():
+                    self.declare_sprite_in_background(name, path)
+            else:
+                for name, path in sprites.items():
+                    self.declare_simple_sprite(name, path)
         
         self._loaded_resource_files.add(filepath)
         self._loaded_resource_names.add(resource_name)
\ No newline at end of file
@@ -0,0 +1,150 @@
+import gc
+import time
+from typing import Callable, Dict, Optional
+
+class FrameScheduler:
+    """Decides what runs in the time left over at the end of each frame.
+    After 'control_gc' is called, automatic collections of the oldest
+    generation are turned off, and collections of the older generations are
+    instead run when the frame has time to spare for them. Idle tasks, such
+    as prefetching textures, evicting caches or saving, are called in turn,
+    each at most once per frame, while the frame has budget left. Each task
+    should do a small slice of its work per call.
+    Frames which take more than HITCH_FACTOR times the frame time are
+    counted as hitches, separately for while the GC is controlled or not,
+    so that the two can be compared."""
+    HITCH_FACTOR = 1.5
+    # A full collection is run even without spare time after this many
+    # frames of it being due, so that memory can not grow without bounds
+    MAX_GC_DELAY = 600
+
+    def __init__(self, frame_time: float = 1 / 60, margin: float = 0.001):
+        self.frame_time = frame_time
+        self.margin = margin # Time left unused at the end of the frame
+        self.clock = time.perf_counter
+        self.gc_controlled = False
+        self._thresholds = None # The thresholds from before controlling the GC
+        self._gc_costs = [0.0, 0.0, 0.0] # Duration of the last collection by generation
+        self._gc_due_frames = 0
+        self.collections = [0, 0, 0]
+        self._tasks = [] # [[task, duration of the last call]]
+        self._next_task = 0
+        self._frame_start = None
+        self.frames = {False: 0, True: 0} # {GC controlled: count}
+        self.hitches = {False: 0, True: 0}
+        self.idle_time = 0.0
+
+    def control_gc(self):
+        """Disables automatic collections of the oldest generation, which are
+        then run by 'run_idle' instead."""
+        if self.gc_controlled:
+            return
+        self._thresholds = gc.get_threshold()
+        t0, t1, _ = self._thresholds
+        gc.set_threshold(t0, t1, 2**30)
+        self.gc_controlled = True
+
+    def release_gc(self):
+        """Restores automatic garbage collection."""
+        if not self.gc_controlled:
+            return
+        gc.set_threshold(*self._thresholds)
+        self.gc_controlled = False
+
+    def freeze(self):
+        """Moves every object tracked by the GC into a permanent generation,
+        which is never collected. Calling this after loading a level makes
+        full collections much faster."""
+        gc.collect()
+        gc.freeze()
+
+    def add_idle_task(self, task: Callable[[], None]):
+        """Adds a function to call when a frame has time to spare."""
+        self._tasks.append([task, 0.0])
+
+    def remove_idle_task(self, task: Callable[[], None]):
+        for i, (t, _) in enumerate(self._tasks):
+            if t is task:
+                del self._tasks[i]
+                return
+        raise ValueError("{} is not an idle task".format(task))
+
+    def begin_frame(self):
+        """Marks the start of a frame, and counts the previous frame as a
+        hitch if it took too long."""
+        now = self.clock()
+        if self._frame_start is not None:
+            controlled = self.gc_controlled
+            self.frames[controlled] += 1
+            if now - self._frame_start > self.frame_time * self.HITCH_FACTOR:
+                self.hitches[controlled] += 1
+        self._frame_start = now
+
+    def time_left(self) -> float:
+        """Returns the seconds left until the end of the current frame, which
+        is negative when the frame has overrun."""
+        if self._frame_start is None:
+            return self.frame_time
+        return self._frame_start + self.frame_time - self.clock()
+
+    def _gc_due(self) -> int:
+        """Returns the oldest generation whose collection is due, or -1."""
+        t0, t1, t2 = self._thresholds
+        _, count1, count2 = gc.get_count()
+        if count2 >= t2:
+            return 2
+        if count1 >= t1 // 2:
+            return 1
+        return -1
+
+    def _collect(self, generation: int):
+        start = self.clock()
+        gc.collect(generation)
+        self._gc_costs[generation] = self.clock() - start
+        self.collections[generation] += 1
+
+    def run_idle(self, deadline: Optional[float] = None):
+        """Runs due collections and idle tasks until the deadline, which is
+        the end of the frame minus the margin by default."""
+        clock = self.clock
+        start = clock()
+        if deadline is None:
+            frame_start = self._frame_start if self._frame_start is not None else start
+            deadline = frame_start + self.frame_time - self.margin
+
+        if self.gc_controlled:
+            generation = self._gc_due()
+            if generation == 2:
+                self._gc_due_frames += 1
+                overdue = self._gc_due_frames > self.MAX_GC_DELAY
+                if overdue or start + self._gc_costs[2] < deadline:
+                    self._collect(2)
+                    self._gc_due_frames = 0
+                elif start + self._gc_costs[1] < deadline:
+                    self._collect(1)
+            elif generation == 1 and start + self._gc_costs[1] < deadline:
+                self._collect(1)
+
+        tasks = self._tasks
+        ran = 0
+        while tasks and ran < len(tasks):
+            now = clock()
+            index = self._next_task % len(tasks)
+            entry = tasks[index]
+            if now + entry[1] >= deadline:
+                break
+            entry[0]()
+            entry[1] = clock() - now
+            self._next_task = index + 1
+            ran += 1
+        self.idle_time += clock() - start
+
+    def report(self) -> Dict[str, dict]:
+        """Returns the number of frames and hitches with and without the GC
+        controlled, and the number of collections run by the scheduler."""
+        return {
+            "uncontrolled": {"frames": self.frames[False], "hitches": self.hitches[False]},
+            "controlled": {"frames": self.frames[True], "hitches": self.hitches[True]},
+            "collections": {"gen1": self.collections[1], "gen2": self.collections[2]},
+            "idle_time": self.idle_time,
+        }
@@ -0,0 +1,198 @@
+"""Saves the entities of a group into compact binary snapshots, and restores
+them without running the level loader.
+Every class of entity in a snapshot must be registered. Without hooks, the
+attributes of an entity are saved, and restored onto an instance made
+without calling its constructor. Attributes referring to an entity group or
+a renderer are saved as None, as entities get their group back when they
+are initialized. Classes holding resources, such as draw functions, give
+their own hooks instead:
+    register(Sprite, save=lambda s: (s.x, s.y),
+        restore=lambda state, resources: Sprite(*state, resources))
+A snapshot starts with a header of MAGIC, VERSION, its kind, its serial
+number, the serial it is a delta of, and the length of its payload. The
+state of each entity is pickled on its own, so that deltas compare the
+saved bytes and notice attributes which were changed in place.
+Message connections are not saved. Restored entities are initialized, so
+handlers connected in 'init' are connected again, but others are lost."""
+import mmap
+import pickle
+import struct
+from typing import Any, Callable, Optional, Union
+
+from .entity_group import EntityGroup
+
+MAGIC = b"DLGS"
+VERSION = 2
+FULL = 0
+DELTA = 1
+HEADER = struct.Struct("<4sHBxIII")
+
+_registry = {} # {name: (cls, save, restore)}
+_names = {} # {cls: name}
+
+def _is_reference(value: Any) -> bool:
+    """Whether the value is a group or a renderer, which is not part of the
+    state of an entity."""
+    return isinstance(value, EntityGroup) or (
+        hasattr(value, "present") and hasattr(value, "copy_ex"))
+
+def _save_attributes(entity: Any) -> dict:
+    return {
+        name: None if _is_reference(value) else value
+        for name, value in vars(entity).items()
+    }
+
+def _restore_attributes(cls: type) -> Callable:
+    def restore(state: dict, context: Any) -> Any:
+        entity = cls.__new__(cls)
+        entity.__dict__.update(state)
+        return entity
+    return restore
+
+def register(cls: type, name: Optional[str] = None, save: Optional[Callable] = None,
+        restore: Optional[Callable] = None) -> type:
+    """Registers a class of entities to be saved in snapshots.
+    'save(entity)' returns the state of an entity, which must be picklable,
+    and 'restore(state, context)' makes a new entity from it, where the
+    context is what was given to 'restore_snapshot', such as the resources.
+    Returns the class, so that this can be used as a decorator."""
+    if name is None:
+        name = cls.__name__
+    if name in _registry and _registry[name][0] is not cls:
+        raise ValueError("{!r} is already registered for {}".format(name, _registry[name][0]))
+    _registry[name] = (
+        cls,
+        save if save is not None else _save_attributes,
+        restore if restore is not None else _restore_attributes(cls),
+    )
+    _names[cls] = name
+    return cls
+
+def read(source: Union[bytes, str]) -> tuple:
+    """Returns the kind, serial, base serial and payload of a snapshot, given
+    as bytes or as the path of a file, which is memory-mapped."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return _parse(source)
+    with open(source, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                return _parse(view)
+            finally:
+                view.release()
+
+def _parse(buffer) -> tuple:
+    if len(buffer) < HEADER.size:
+        raise ValueError("The snapshot is truncated")
+    magic, version, kind, serial, base, length = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError("Not a dalgi snapshot")
+    if version != VERSION:
+        raise ValueError("Unsupported snapshot version {} (expected {})".format(version, VERSION))
+    if len(buffer) < HEADER.size + length:
+        raise ValueError("The snapshot is truncated")
+    payload = pickle.loads(buffer[HEADER.size:HEADER.size + length])
+    return kind, serial, base, payload
+
+class Snapshotter:
+    """Saves the entities of a group, with their draw layers and tags, into
+    full or delta snapshots, and restores the group from them.
+    A delta snapshot only stores the entities whose state, layer or tags
+    changed since the previous snapshot, and the entities removed since."""
+    def __init__(self, group):
+        self.group = group
+        self.serial = 0 # The serial of the last snapshot
+        self._ids = {} # {entity: ID}
+        self._next_id = 0
+        self._saved = {} # {ID: record} as of the last snapshot
+
+    def _record(self, entity: Any, record, tag_names: list) -> tuple:
+        name = _names.get(type(entity))
+        if name is None:
+            raise ValueError("{} is not registered for snapshots".format(type(entity)))
+        entity_id = self._ids.get(entity)
+        if entity_id is None:
+            entity_id = self._ids[entity] = self._next_id
+            self._next_id += 1
+        tags = tuple(i for i in range(len(tag_names)) if record.mask >> i & 1)
+        state = pickle.dumps(_registry[name][1](entity), pickle.HIGHEST_PROTOCOL)
+        return (entity_id, name, record.layer, tags, state)
+
+    def save(self, path: Optional[str] = None, delta: bool = False) -> bytes:
+        """Returns a snapshot of the group, and writes it to the path if one
+        is given. A delta snapshot can only be restored on top of the
+        snapshots before it."""
+        if delta and self.serial == 0:
+            raise ValueError("A delta snapshot needs a previous snapshot")
+        group = self.group
+        tag_names = group._tag_names
+        records = {}
+        for entity, membership in group._entities.items():
+            record = self._record(entity, membership, tag_names)
+            records[record[0]] = record
+
+        if delta:
+            saved = self._saved
+            changed = [r for i, r in records.items() if saved.get(i) != r]
+            removed = [i for i in saved if i not in records]
+        else:
+            changed = list(records.values())
+            removed = []
+        live = set(records)
+        self._ids = {e: i for e, i in self._ids.items() if i in live}
+        self._saved = records
+
+        base = self.serial if delta else 0
+        self.serial += 1
+        payload = pickle.dumps((list(tag_names), changed, removed), pickle.HIGHEST_PROTOCOL)
+        data = HEADER.pack(MAGIC, VERSION, DELTA if delta else FULL, self.serial, base, len(payload)) + payload
+        if path is not None:
+            with open(path, "wb") as f:
+                f.write(data)
+        return data
+
+    def restore(self, *sources: Union[bytes, str], context: Any = None):
+        """Replaces the entities of the group with those of a full snapshot,
+        with the given delta snapshots applied in order."""
+        records = {} # {ID: (name, layer, tags, pickled state)}
+        serial = None
+        for source in sources:
+            kind, snapshot_serial, base, (tag_names, changed, removed) = read(source)
+            if serial is None:
+                if kind != FULL:
+                    raise ValueError("Restoring must start from a full snapshot")
+            elif kind != DELTA or base != serial:
+                raise ValueError("Snapshot {} is not a delta of snapshot {}".format(snapshot_serial, serial))
+            serial = snapshot_serial
+            for entity_id in removed:
+                del records[entity_id]
+            for entity_id, name, layer, tags, state in changed:
+                records[entity_id] = (name, layer, tuple(tag_names[i] for i in tags), state)
+        if serial is None:
+            raise ValueError("No snapshot to restore")
+
+        added = {} # {entity: layer} in the order of the snapshot
+        tagged = [] # [(entity, tags)]
+        ids = {}
+        saved = {}
+        group = self.group
+        for entity_id, (name, layer, tags, state) in records.items():
+            if name not in _registry:
+                raise ValueError("{!r} is not registered for snapshots".format(name))
+            entity = _registry[name][2](pickle.loads(state), context)
+            ids[entity] = entity_id
+            added[entity] = layer
+            if tags:
+                tagged.append((entity, tags))
+        group.replace_entities(added, tagged)
+
+        # The saved records are recomputed, as tag bits may differ between
+        # the snapshot and the group
+        tag_names = group._tag_names
+        self._ids = ids
+        for entity, membership in group._entities.items():
+            record = self._record(entity, membership, tag_names)
+            saved[record[0]] = record
+        self._saved = saved
+        self._next_id = max(self._next_id, max(records, default=-1) + 1)
+        self.serial = serial
@@ -0,0 +1,117 @@
+from typing import Any, Dict, Tuple
+
+Bounds = Tuple[int, int, int, int]
+
+def overlaps(a: Bounds, b: Bounds) -> bool:
+    """Returns whether the two rectangles overlap."""
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+def union(a: Bounds, b: Bounds) -> Bounds:
+    """Returns the smallest rectangle containing both rectangles."""
+    x = min(a[0], b[0])
+    y = min(a[1], b[1])
+    return (x, y, max(a[0] + a[2], b[0] + b[2]) - x, max(a[1] + a[3], b[1] + b[3]) - y)
+
+class SpatialGrid:
+    """A uniform grid of square cells, which indexes entities by their
+    bounding rectangle (x, y, w, h) so that the entities at a point or in an
+    area can be found without checking every entity."""
+    def __init__(self, cell_size: int = 64):
+        assert(cell_size > 0)
+        self.cell_size = cell_size
+        self._cells = {} # {(cx, cy): {entity: bounds}}
+        self._entries = {} # {entity: (bounds, cell range)}
+
+    def __contains__(self, entity: Any) -> bool:
+        return entity in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _cell_range(self, bounds: Bounds) -> Bounds:
+        x, y, w, h = bounds
+        size = self.cell_size
+        # An empty rectangle still occupies the cell of its corner
+        return (x // size, y // size, (x + max(w, 1) - 1) // size, (y + max(h, 1) - 1) // size)
+
+    def insert(self, entity: Any, bounds: Bounds):
+        assert(entity not in self._entries)
+        cell_range = self._cell_range(bounds)
+        self._entries[entity] = (bounds, cell_range)
+        self._add_to_cells(entity, bounds, cell_range)
+
+    def move(self, entity: Any, bounds: Bounds):
+        """Updates the bounds of an indexed entity. Only the cells that it
+        enters or leaves are changed."""
+        old_bounds, old_range = self._entries[entity]
+        if bounds == old_bounds:
+            return
+        cell_range = self._cell_range(bounds)
+        self._entries[entity] = (bounds, cell_range)
+        if cell_range == old_range:
+            cells = self._cells
+            x0, y0, x1, y1 = cell_range
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    cells[(cx, cy)][entity] = bounds
+        else:
+            self._remove_from_cells(entity, old_range)
+            self._add_to_cells(entity, bounds, cell_range)
+
+    def remove(self, entity: Any):
+        _, cell_range = self._entries.pop(entity)
+        self._remove_from_cells(entity, cell_range)
+
+    def _add_to_cells(self, entity: Any, bounds: Bounds, cell_range: Bounds):
+        cells = self._cells
+        x0, y0, x1, y1 = cell_range
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = cells.get((cx, cy))
+                if cell is None:
+                    cell = cells[(cx, cy)] = {}
+                cell[entity] = bounds
+
+    def _remove_from_cells(self, entity: Any, cell_range: Bounds):
+        cells = self._cells
+        x0, y0, x1, y1 = cell_range
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = cells[(cx, cy)]
+                del cell[entity]
+                if not cell:
+                    del cells[(cx, cy)]
+
+    def bounds(self, entity: Any) -> Bounds:
+        return self._entries[entity][0]
+
+    def query_point(self, x: int, y: int) -> Dict[Any, Bounds]:
+        """Returns the {entity: bounds} of the entities whose bounds contain
+        the given point."""
+        size = self.cell_size
+        cell = self._cells.get((x // size, y // size))
+        if not cell:
+            return {}
+        return {
+            entity: bounds for entity, bounds in cell.items()
+            if bounds[0] <= x < bounds[0] + bounds[2] and bounds[1] <= y < bounds[1] + bounds[3]
+        }
+
+    def query_rect(self, x: int, y: int, w: int, h: int) -> Dict[Any, Bounds]:
+        """Returns the {entity: bounds} of the entities whose bounds overlap
+        the given rectangle."""
+        found = {}
+        cells = self._cells
+        x0, y0, x1, y1 = self._cell_range((x, y, w, h))
+        right = x + w
+        bottom = y + h
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = cells.get((cx, cy))
+                if not cell:
+                    continue
+                for entity, bounds in cell.items():
+                    if (bounds[0] < right and x < bounds[0] + bounds[2]
+                            and bounds[1] < bottom and y < bounds[1] + bounds[3]):
+                        found[entity] = bounds
+        return found
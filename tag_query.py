@@ -0,0 +1,39 @@
+from types import MappingProxyType
+from typing import Any, Iterator
+
+class TagQuery:
+    """The entities of a group which have every required tag and none of the
+    excluded ones, with the tags of each entity stored as the bits of an
+    integer mask.
+    The matching entities are kept up to date as tags change, in the order
+    in which they started to match, and 'results' is a read-only view of
+    them which is the same object on every call."""
+    __slots__ = ("required", "excluded", "_matches", "results")
+
+    def __init__(self, required: int, excluded: int):
+        self.required = required
+        self.excluded = excluded
+        self._matches = {} # {entity: None}
+        self.results = MappingProxyType(self._matches)
+
+    def matches(self, mask: int) -> bool:
+        return mask & self.required == self.required and not mask & self.excluded
+
+    def update(self, entity: Any, old: int, new: int):
+        """Updates the results for an entity whose mask changed."""
+        was = self.matches(old)
+        now = self.matches(new)
+        if was != now:
+            if now:
+                self._matches[entity] = None
+            else:
+                del self._matches[entity]
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._matches)
+
+    def __len__(self) -> int:
+        return len(self._matches)
+
+    def __contains__(self, entity: Any) -> bool:
+        return entity in self._matches
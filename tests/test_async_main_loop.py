@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+
+pytest.importorskip("sdl2")
+
+from dalgi import utils
+from dalgi.headless import HeadlessRenderer
+
+class Builder:
+    def __init__(self, result):
+        self.result = result
+
+    def title(self, title):
+        return self
+
+    def finish(self):
+        return self.result
+
+class HeadlessWindow:
+    def __init__(self, renderer):
+        self.renderer = renderer
+
+    def build_renderer(self):
+        return Builder(self.renderer)
+
+class HeadlessContext:
+    """Stands in for the SDL2 context, with a headless renderer and no
+    events."""
+    def __init__(self):
+        self.renderer = HeadlessRenderer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def build_window(self):
+        return Builder(HeadlessWindow(self.renderer))
+
+    def set_quit_handler(self, handler):
+        self.quit_handler = handler
+
+    def get_events(self):
+        return []
+
+class EchoClient:
+    """Sends a line to the echo server every frame, and asks the group to
+    quit once it has heard back 'rounds' times."""
+    def __init__(self, port, rounds):
+        self.port = port
+        self.rounds = rounds
+        self.replies = []
+        self.group = None
+
+    def init(self, group):
+        self.group = group
+
+    async def async_update(self, delta_time):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write("ping {}\n".format(len(self.replies)).encode())
+        await writer.drain()
+        self.replies.append(await reader.readline())
+        writer.close()
+        await writer.wait_closed()
+        if len(self.replies) == self.rounds:
+            self.group.quit()
+
+async def echo(reader, writer):
+    writer.write(await reader.readline())
+    await writer.drain()
+    writer.close()
+
+async def run_client(monkeypatch, rounds):
+    monkeypatch.setattr(utils, "init_everything", HeadlessContext)
+    server = await asyncio.start_server(echo, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    client = EchoClient(port, rounds)
+    groups = []
+    def setup(window, renderer, group):
+        group.add(client)
+        groups.append(group)
+    async with server:
+        await asyncio.wait_for(utils.run_async_main_loop(setup, max_fps=240, async_timeout=1), 10)
+    return client, groups[0]
+
+def test_quit_request_ends_the_async_main_loop(monkeypatch):
+    client, group = asyncio.run(run_client(monkeypatch, rounds=3))
+    assert client.replies == [b"ping 0\n", b"ping 1\n", b"ping 2\n"]
+    assert group.quit_requested
+    assert group.async_timeouts == 0
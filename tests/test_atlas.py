@@ -0,0 +1,38 @@
+import pytest
+from dalgi.atlas import ShelfPacker
+
+def rects(sizes, placements):
+    return [(page, x, y, w, h) for (w, h), (page, x, y) in zip(sizes, placements)]
+
+def overlaps(a, b):
+    return (a[0] == b[0] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+        and a[2] < b[2] + b[4] and b[2] < a[2] + a[4])
+
+def test_shelves_are_packed_tallest_first():
+    packer = ShelfPacker(page_size=64, padding=1)
+    placements = packer.pack([(10, 8), (20, 16), (30, 16), (10, 10)])
+    # The 16 pixel tall rectangles and the 10 pixel one share the first
+    # shelf, and the last one opens a shelf below it
+    assert placements == [(0, 0, 17), (0, 31, 0), (0, 0, 0), (0, 52, 0)]
+    assert packer.page_sizes() == [(62, 25)]
+
+def test_short_rectangles_fill_taller_shelves():
+    packer = ShelfPacker(page_size=100, padding=0)
+    placements = packer.pack([(50, 40), (20, 10), (30, 10)])
+    # Both short rectangles fit next to the tall one on the first shelf
+    assert placements == [(0, 0, 0), (0, 80, 0), (0, 50, 0)]
+
+def test_full_pages_open_new_pages_without_overlaps():
+    sizes = [(30, 30)] * 10 + [(12, 7)] * 20
+    packer = ShelfPacker(page_size=64, padding=2)
+    placed = rects(sizes, packer.pack(sizes))
+    assert len(packer.pages) > 1
+    for i, a in enumerate(placed):
+        page, x, y, w, h = a
+        assert x + w <= 64 and y + h <= 64
+        for b in placed[i + 1:]:
+            assert not overlaps(a, b)
+
+def test_oversized_rectangles_are_rejected():
+    with pytest.raises(ValueError):
+        ShelfPacker(page_size=32).pack([(33, 1)])
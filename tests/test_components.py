@@ -0,0 +1,40 @@
+from dalgi.components import ComponentStore
+from dalgi.parallel import _SharedColumns, _buffer_size
+
+def filled_store():
+    store = ComponentStore(capacity=2)
+    store.spawn(1.0, 2.0, vx=10.0, sprite=3)
+    store.spawn(5.0, 6.0, vy=-10.0, rotation=90.0, sprite=2**40)
+    store.spawn(7.0, 8.0, sprite=1)
+    return store
+
+def test_columns_grow_and_integrate():
+    store = filled_store()
+    assert store.capacity == 4
+    store.integrate(0.5)
+    assert list(store.columns["x"][:3]) == [6.0, 5.0, 7.0]
+    assert list(store.columns["y"][:3]) == [2.0, 1.0, 8.0]
+
+def test_despawn_moves_the_last_entity_into_the_gap():
+    store = ComponentStore()
+    first = store.spawn(1.0, 0.0)
+    store.spawn(2.0, 0.0)
+    last = store.spawn(3.0, 0.0)
+    store.despawn(first)
+    assert not first.alive
+    assert last.index == 0
+    assert last.x == 3.0
+    assert len(store) == 2
+
+def test_shared_columns_round_trip():
+    store = filled_store()
+    buffer = memoryview(bytearray(2 * _buffer_size(8)))
+    columns = _SharedColumns(buffer, 8)
+    columns.write(3, store)
+    header, shared = columns.buffers[1]
+    assert list(header) == [3, 3]
+    assert list(shared["x"][:3]) == [1.0, 5.0, 7.0]
+    assert list(shared["rotation"][:3]) == [0.0, 90.0, 0.0]
+    # Sprite IDs keep 64 bits on every platform
+    assert list(shared["sprite"][:3]) == [3, 2**40, 1]
+    columns.release()
@@ -0,0 +1,113 @@
+import pytest
+
+sdl2 = pytest.importorskip("sdl2")
+
+from dalgi.display_list import FILL
+from dalgi.entity_group import EntityGroup
+from dalgi.headless import HeadlessRenderer, FILL_RECT, COMMAND_SIZE
+
+class Tile:
+    def __init__(self, x, y):
+        self.rect = sdl2.Rect(x, y, 10, 10)
+        self.revision = 0
+        self.builds = 0
+
+    def draw(self, renderer, ox, oy):
+        raise AssertionError("Tiles are drawn from their display commands")
+
+    def display_commands(self):
+        self.builds += 1
+        return [(FILL, (255, 0, 0), None, self.rect)]
+
+class Plain:
+    def __init__(self):
+        self.draws = 0
+
+    def draw(self, renderer, ox, oy):
+        self.draws += 1
+
+def fill_rects(renderer):
+    commands = renderer.commands
+    return [
+        tuple(commands[i + 2:i + 6])
+        for i in range(0, len(commands), COMMAND_SIZE)
+        if commands[i] == FILL_RECT
+    ]
+
+def scene(static=False):
+    group = EntityGroup(5, 5)
+    tiles = [Tile(0, 0), Tile(20, 0)]
+    plain = Plain()
+    group.add_many(tiles)
+    group.add(plain)
+    group.enable_display_lists()
+    if static:
+        group.set_layer_static(1)
+    group.init()
+    return group, tiles, plain
+
+def draw(group):
+    renderer = HeadlessRenderer(keep_frames=True)
+    group.draw(renderer)
+    return fill_rects(renderer)
+
+def test_commands_are_only_rebuilt_on_revision_changes():
+    group, tiles, plain = scene()
+    assert draw(group) == [(5, 5, 10, 10), (25, 5, 10, 10)]
+    draw(group)
+    assert [t.builds for t in tiles] == [1, 1]
+    assert plain.draws == 2
+
+    tiles[1].revision += 1
+    draw(group)
+    assert [t.builds for t in tiles] == [2, 2]
+
+def test_commands_are_rebuilt_when_the_layer_changes():
+    group, tiles, _ = scene()
+    draw(group)
+    extra = Tile(40, 0)
+    group.add(extra)
+    group.update(0)
+    assert len(draw(group)) == 3
+    assert tiles[0].builds == 2
+
+    group.remove(extra)
+    group.update(0)
+    assert len(draw(group)) == 2
+
+def test_destination_rects_follow_entity_rects_in_place():
+    group, tiles, _ = scene()
+    draw(group)
+    display_list = group._display_lists[1]
+    destination = display_list.commands[0][3]
+    tiles[0].rect.x = 50
+    assert draw(group)[0] == (55, 5, 10, 10)
+    group.x = 0
+    assert draw(group)[0] == (50, 5, 10, 10)
+    assert display_list.commands[0][3] is destination
+    assert tiles[0].builds == 1
+
+def test_static_layers_ignore_revisions_until_invalidated():
+    group, tiles, _ = scene(static=True)
+    draw(group)
+    tiles[0].revision += 1
+    tiles[0].rect.x = 50
+    assert draw(group)[0] == (5, 5, 10, 10)
+    assert tiles[0].builds == 1
+
+    group.x = 0
+    assert draw(group)[0] == (50, 5, 10, 10)
+    group.invalidate_layer(1)
+    draw(group)
+    assert tiles[0].builds == 2
+
+def test_profiled_draws_use_the_display_lists():
+    from dalgi.profiler import FrameProfiler
+    group, tiles, plain = scene()
+    group.profiler = FrameProfiler()
+    assert draw(group) == [(5, 5, 10, 10), (25, 5, 10, 10)]
+    draw(group)
+    assert [t.builds for t in tiles] == [1, 1]
+    report = group.profiler.report()
+    assert report["draw"]
+    assert "draw:Plain" not in report
@@ -0,0 +1,190 @@
+import pytest
+from dalgi.entity_group import EntityGroup
+from dalgi.headless import HeadlessRenderer, CLEAR, COMMAND_SIZE
+
+class Counter:
+    def __init__(self, log, name):
+        self.log = log
+        self.name = name
+
+    def update(self, delta_time):
+        self.log.append(self.name)
+
+def make_group(count):
+    log = []
+    group = EntityGroup()
+    entities = [Counter(log, i) for i in range(count)]
+    for entity in entities:
+        group.add(entity)
+    group.init()
+    return group, entities, log
+
+def test_removal_keeps_update_order():
+    group, entities, log = make_group(10)
+    group.remove(entities[1])
+    group.update(0)
+    assert log == [0, 2, 3, 4, 5, 6, 7, 8, 9]
+
+def test_order_is_kept_when_listeners_are_compacted():
+    group, entities, log = make_group(10)
+    for i in (1, 3, 4, 6, 8):
+        group.remove(entities[i])
+    group.update(0)
+    assert log == [0, 2, 5, 7, 9]
+    assert None not in group._listeners["update"]
+
+    log.clear()
+    group.remove(entities[5])
+    group.add(entities[1])
+    group.update(0)
+    assert log == [0, 2, 7, 9, 1]
+
+class Destroyable:
+    def __init__(self, log):
+        self.log = log
+
+    def destroy(self):
+        self.log.append("destroyed")
+
+def test_changes_queued_before_init_wait_for_init():
+    log = []
+    group = EntityGroup()
+    doomed = Destroyable(log)
+    group.add(doomed)
+    group.destroy(doomed)
+    other = Destroyable(log)
+    group.add(other)
+    group.add_tags(other, "other")
+    # Adding and tagging apply immediately, but the destruction waits
+    assert doomed in group._entities
+    assert list(group.find_all_with_tag("other")) == [other]
+    assert log == []
+
+    group.init()
+    assert doomed not in group._entities
+    assert other in group._entities
+    assert log == ["destroyed"]
+
+class Plain:
+    pass
+
+def test_listener_set_on_an_instance_is_called():
+    log = []
+    group = EntityGroup()
+    plain = Plain()
+    group.add(plain)
+    listener = Plain()
+    listener.update = lambda delta_time: log.append(delta_time)
+    group.add(listener)
+    group.init()
+    group.update(0.5)
+    assert log == [0.5]
+    assert plain not in group._listeners["update"]
+
+class Box:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.revision = 0
+
+    def bounds(self):
+        return (self.x, self.y, 10, 10)
+
+    def draw(self, renderer, ox, oy):
+        renderer.c_fill_rect((0, 0, 0), (self.x + ox, self.y + oy, 10, 10))
+
+def opcodes(renderer):
+    return renderer.commands[::COMMAND_SIZE].tolist()
+
+def dirty_scene(retained):
+    renderer = HeadlessRenderer(keep_frames=True)
+    group = EntityGroup()
+    boxes = [Box(i * 20, 0) for i in range(5)]
+    group.add_many(boxes)
+    group.enable_dirty_rendering(retained=retained)
+    group.init()
+    assert group.draw(renderer)
+    del renderer.commands[:]
+    assert not group.draw(renderer)
+    assert group.skipped_count == 5
+    boxes[2].revision += 1
+    return renderer, group
+
+def test_dirty_rendering_redraws_everything_without_retained_target():
+    renderer, group = dirty_scene(retained=False)
+    assert group.draw(renderer)
+    assert opcodes(renderer).count(CLEAR) == 1
+    assert group.drawn_count == 5
+
+def test_dirty_rendering_redraws_changed_region_of_retained_target():
+    pytest.importorskip("sdl2")
+    renderer, group = dirty_scene(retained=True)
+    assert group.draw(renderer)
+    assert CLEAR not in opcodes(renderer)
+    assert group.drawn_count == 1
+    assert group.skipped_count == 4
+
+class Pointer:
+    def __init__(self):
+        self.moves = []
+        self.scrolls = []
+
+    def mouse_moved(self, sx, sy, x, y, dx, dy):
+        self.moves.append((x, y, dx, dy))
+
+    def mouse_scrolled(self, dx, dy, direction):
+        self.scrolls.append((dx, dy, direction))
+
+def mouse_events():
+    events = pytest.importorskip("sdl2.events")
+    return [
+        events.MouseMotion(x=1, y=1, xrel=1, yrel=1),
+        events.MouseMotion(x=3, y=2, xrel=2, yrel=1),
+        events.MouseWheel(x=0, y=1, direction=0),
+        events.MouseWheel(x=0, y=2, direction=0),
+    ]
+
+def test_events_are_delivered_one_by_one_by_default():
+    recording = mouse_events()
+    group = EntityGroup()
+    pointer = Pointer()
+    group.add(pointer)
+    group.init()
+    group.handle_events(recording)
+    assert pointer.moves == [(1, 1, 1, 1), (3, 2, 2, 1)]
+    assert pointer.scrolls == [(0, 1, 0), (0, 2, 0)]
+
+def test_coalescing_merges_mouse_motion_and_wheel_events():
+    recording = mouse_events()
+    group = EntityGroup()
+    pointer = Pointer()
+    group.add(pointer)
+    group.init()
+    group.handle_events(recording, coalesce=True)
+    assert pointer.moves == [(3, 2, 3, 2)]
+    assert pointer.scrolls == [(0, 3, 0)]
+
+def test_invalidated_capabilities_apply_to_entities_added_afterwards():
+    from dalgi.entity_group import invalidate_capabilities
+
+    class Patched:
+        pass
+
+    log = []
+    group = EntityGroup()
+    before = Patched()
+    group.add(before)
+    group.init()
+    Patched.update = lambda self, delta_time: log.append(self)
+    invalidate_capabilities(Patched)
+    after = Patched()
+    group.add(after)
+    group.update(0)
+    assert log == [after]
+
+    group.remove(before)
+    group.update(0)
+    group.add(before)
+    log.clear()
+    group.update(0)
+    assert log == [after, before]
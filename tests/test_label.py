@@ -0,0 +1,72 @@
+import gc
+
+import pytest
+
+sdl2 = pytest.importorskip("sdl2")
+
+from dalgi.ui import text_cache
+from dalgi.ui.label import Label
+
+class FakeFont:
+    def __init__(self, glyph_size):
+        self.glyph_size = glyph_size
+
+    def render_blended(self, text, color):
+        return sdl2.Surface.blank(self.glyph_size * len(text), self.glyph_size)
+
+    def size(self, text):
+        return (self.glyph_size * len(text), self.glyph_size)
+
+    def line_skip(self):
+        return self.glyph_size
+
+class FakeTexture:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.destroyed = False
+
+    def destroy(self):
+        self.destroyed = True
+
+    def rect_at(self, x, y):
+        return sdl2.Rect(x, y, self.width, self.height)
+
+class FakeRenderer:
+    def __init__(self):
+        self.copied = []
+
+    def create_texture_from_surface(self, surface):
+        return FakeTexture(surface.width, surface.height)
+
+    def copy(self, texture, src_rect=None, dst_rect=None):
+        self.copied.append(texture)
+
+def test_dropped_label_releases_its_cached_lines(monkeypatch):
+    monkeypatch.setattr(text_cache.line_cache, "max_bytes", 0)
+    renderer = FakeRenderer()
+    label = Label(0, 0, "first\nsecond", FakeFont(8), renderer)
+    label.draw(renderer, 0, 0)
+    textures = list(label.textures)
+    assert len(textures) == 2
+    assert not any(texture.destroyed for texture in textures)
+
+    del label
+    gc.collect()
+    assert all(texture.destroyed for texture in textures)
+    assert not any(key[0] is renderer for key in text_cache.line_cache._entries)
+
+def test_glyphs_outgrowing_the_atlas_fall_back_to_the_line_cache():
+    renderer = FakeRenderer()
+    font = FakeFont(64) # 256 glyphs fit in a 1024 pixel atlas
+    wide = "".join(chr(0x4E00 + i) for i in range(300))
+    label = Label(0, 0, wide, font, renderer, glyph_atlas=True)
+    label.draw(renderer, 0, 0)
+    assert renderer.copied == label.textures
+    assert label.bounds()[2] == 64 * 300
+
+    label.text = "abc"
+    label.draw(renderer, 0, 0)
+    assert label.textures == []
+    assert label.bounds()[2] == 64 * 3
+    label.destroy()
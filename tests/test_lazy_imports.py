@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCRIPT = """
+import json, sys
+import dalgi
+imported = set(sys.modules)
+from dalgi.headless import HeadlessRenderer
+group = dalgi.EntityGroup()
+group.init()
+renderer = HeadlessRenderer()
+group.update(1 / 60)
+group.draw(renderer)
+renderer.present()
+heavy = ("sdl2", "ftoml", "numpy", "asyncio", "dalgi.components", "dalgi.resources")
+print(json.dumps({
+    "on_import": sorted(m for m in imported if m.startswith("dalgi.")),
+    "first_frame": [m for m in heavy if m in sys.modules],
+}))
+"""
+
+def run_fresh(script):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    result = subprocess.run(
+        [sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout)
+
+def test_importing_dalgi_imports_no_submodules():
+    assert run_fresh(SCRIPT)["on_import"] == []
+
+def test_headless_first_frame_imports_no_heavy_modules():
+    assert run_fresh(SCRIPT)["first_frame"] == []
+
+def test_lazy_names_resolve_to_their_modules():
+    import dalgi
+    from dalgi.entity_group import EntityGroup
+    from dalgi.framerate_limiter import FramerateLimiter
+    assert dalgi.EntityGroup is EntityGroup
+    assert dalgi.FramerateLimiter is FramerateLimiter
+    assert set(dalgi.__all__) <= set(dir(dalgi))
+    with pytest.raises(AttributeError):
+        dalgi.NoSuchName
@@ -0,0 +1,70 @@
+import pytest
+
+pytest.importorskip("ftoml")
+
+from dalgi.entity_group import EntityGroup
+from dalgi.level import LevelLoader, load_level
+
+class Thing:
+    log = []
+
+    def __init__(self, x, y, resources):
+        self.x = x
+
+    def update(self, delta_time):
+        self.log.append(self.x)
+
+    def draw(self, renderer, ox, oy):
+        pass
+
+def write_level(tmp_path, layers):
+    path = str(tmp_path / "level.toml")
+    with open(path, "w") as f:
+        for x, layer in enumerate(layers):
+            f.write('[[entities]]\ntype = "Thing"\npos = [{}, 0]\nlayer = {}\n'.format(x, layer))
+    return path
+
+@pytest.mark.parametrize("initialized", [False, True])
+def test_entities_update_in_file_order(tmp_path, initialized):
+    path = write_level(tmp_path, [1, 2, 1, 3, 2])
+    group = EntityGroup()
+    if initialized:
+        group.init()
+    load_level(path, group, None, {"Thing": Thing})
+    if not initialized:
+        group.init()
+    Thing.log = []
+    group.update(0)
+    assert Thing.log == [0, 1, 2, 3, 4]
+    layers = {group._entities[e].layer for e in group._entities}
+    assert layers == {1, 2, 3}
+
+class Listener(Thing):
+    def init(self, group):
+        self.group = group
+        group.connect(self, "ping", self.on_ping)
+
+    def on_ping(self):
+        self.log.append("ping {}".format(self.x))
+
+class NoResources:
+    pending_count = 0
+
+    def upload_pending(self, budget=None):
+        return 0
+
+def test_streamed_entities_are_initialized_after_init(tmp_path):
+    path = write_level(tmp_path, [1, 2])
+    group = EntityGroup()
+    group.register_messages("ping")
+    group.init()
+    loader = LevelLoader(path, group, NoResources(), {"Thing": Listener}, chunk_size=1)
+    while not loader.done:
+        loader.step()
+        group.update(0)
+    entities = list(group._entities)
+    assert len(entities) == 2
+    assert all(entity.group is group for entity in entities)
+    Thing.log = []
+    group.send_message("ping")
+    assert Thing.log == ["ping 0", "ping 1"]
@@ -0,0 +1,88 @@
+import pytest
+from dalgi.entity_group import EntityGroup
+from dalgi.messages import MessageBus
+
+class Receiver:
+    def __init__(self, log, name):
+        self.log = log
+        self.name = name
+
+    def on_score(self, *args):
+        self.log.append((self.name, args))
+
+def bus_with(*names):
+    log = []
+    bus = MessageBus()
+    bus.register("score", "reset")
+    receivers = [Receiver(log, name) for name in names]
+    for receiver in receivers:
+        bus.connect(receiver, "score", receiver.on_score)
+    return bus, receivers, log
+
+def test_posted_duplicates_are_delivered_once_in_order():
+    bus, _, log = bus_with("a")
+    bus.post("score", 1)
+    bus.post("score", 2)
+    bus.post("score", 1)
+    assert log == []
+    assert bus.deliver() == 2
+    assert log == [("a", (1,)), ("a", (2,))]
+    assert bus.deliver() == 0
+
+    bus.post("score", 1)
+    assert bus.deliver() == 1
+
+def test_unhashable_arguments_are_not_coalesced():
+    bus, _, log = bus_with("a")
+    bus.post("score", [1])
+    bus.post("score", [1])
+    assert bus.deliver() == 2
+    assert log == [("a", ([1],)), ("a", ([1],))]
+
+def test_messages_posted_by_handlers_wait_for_the_next_delivery():
+    bus, receivers, log = bus_with("a")
+    bus.connect(receivers[0], "reset", lambda: bus.post("score", 0))
+    bus.post("reset")
+    assert bus.deliver() == 1
+    assert log == []
+    assert bus.deliver() == 1
+    assert log == [("a", (0,))]
+
+def test_removed_entities_are_disconnected():
+    log = []
+    group = EntityGroup()
+    group.register_messages("score")
+    first, second = Receiver(log, "first"), Receiver(log, "second")
+    group.add(first)
+    group.add(second)
+    group.init()
+    group.connect(first, "score", first.on_score)
+    group.connect(second, "score", second.on_score)
+    group.send_message("score", 1)
+    group.remove(first)
+    group.update(0)
+    group.send_message("score", 2)
+    assert log == [("first", (1,)), ("second", (1,)), ("second", (2,))]
+
+def test_stats_count_sends_and_time_per_channel():
+    bus, _, _ = bus_with("a", "b")
+    score, reset = bus.register("score", "reset")
+    bus.send(score, 1)
+    bus.post("score", 2)
+    bus.deliver()
+    stats = bus.stats()
+    assert stats["score"]["sends"] == 2
+    assert stats["reset"] == {"sends": 0, "handler_time": 0.0}
+    assert stats["score"]["handler_time"] == 0.0
+
+    bus.timed = True
+    bus.send("score", 3)
+    assert bus.stats()["score"]["handler_time"] > 0.0
+
+def test_sending_unregistered_messages_fails():
+    bus = MessageBus()
+    bus.connect(object(), "unknown", print)
+    with pytest.raises(AssertionError):
+        bus.send("unknown")
+    with pytest.raises(Exception):
+        bus.validate()
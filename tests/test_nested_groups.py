@@ -0,0 +1,108 @@
+from dalgi.entity_group import EntityGroup
+from dalgi.headless import HeadlessRenderer, FILL_RECT, OFFSET, COMMAND_SIZE
+
+class Box:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def draw(self, renderer, ox, oy):
+        renderer.c_fill_rect((0, 0, 0), (self.x + ox, self.y + oy, 10, 10))
+
+class Pointer:
+    def __init__(self):
+        self.presses = []
+
+    def mouse_pressed(self, sx, sy, x, y, button, is_touch):
+        self.presses.append((x, y))
+
+class Mover:
+    def __init__(self):
+        self.updates = 0
+        self.destroyed = False
+
+    def update(self, delta_time):
+        self.updates += 1
+
+    def destroy(self):
+        self.destroyed = True
+
+def nested(child_entity):
+    parent = EntityGroup(100, 50)
+    child = EntityGroup(10, 5)
+    child.add(child_entity)
+    parent.add(child)
+    parent.init()
+    return parent, child
+
+def fill_rects(renderer):
+    commands = renderer.commands
+    return [
+        tuple(commands[i + 2:i + 6])
+        for i in range(0, len(commands), COMMAND_SIZE)
+        if commands[i] == FILL_RECT
+    ]
+
+def test_nested_entities_are_offset_once():
+    parent, child = nested(Box(1, 2))
+    renderer = HeadlessRenderer(keep_frames=True)
+    parent.draw(renderer)
+    assert fill_rects(renderer) == [(111, 57, 10, 10)]
+    assert OFFSET not in renderer.commands[::COMMAND_SIZE].tolist()
+
+def test_world_position_follows_moved_ancestors():
+    parent, child = nested(Box(0, 0))
+    assert child.world_position() == (110, 55)
+    parent.x = 0
+    assert child.world_position() == (10, 55)
+    child.y = 0
+    assert child.world_position() == (10, 50)
+    renderer = HeadlessRenderer(keep_frames=True)
+    parent.draw(renderer)
+    assert fill_rects(renderer) == [(10, 50, 10, 10)]
+
+def test_pointer_events_are_routed_through_the_hierarchy():
+    pointer = Pointer()
+    parent, child = nested(pointer)
+    child.hit_area = (50, 50)
+    parent.mouse_pressed(120, 60, 120, 60, 1, False)
+    # Outside of the hit area of the child group
+    parent.mouse_pressed(200, 60, 200, 60, 1, False)
+    assert pointer.presses == [(10, 5)]
+
+def test_mouse_capture_bypasses_hit_areas():
+    pointer = Pointer()
+    parent, child = nested(pointer)
+    child.hit_area = (50, 50)
+    child.capture_mouse(pointer)
+    parent.mouse_pressed(200, 60, 200, 60, 1, False)
+    assert pointer.presses == [(90, 5)]
+    child.release_mouse(pointer)
+    parent.mouse_pressed(200, 60, 200, 60, 1, False)
+    assert len(pointer.presses) == 1
+
+def test_paused_and_disabled_groups():
+    mover = Mover()
+    parent, child = nested(mover)
+    child.paused = True
+    parent.update(1)
+    assert mover.updates == 0
+    renderer = HeadlessRenderer()
+    assert child.draw(renderer)
+    child.paused = False
+    child.enabled = False
+    parent.update(1)
+    assert mover.updates == 0
+    assert not child.draw(renderer)
+    child.enabled = True
+    parent.update(1)
+    assert mover.updates == 1
+
+def test_destroying_a_nested_group_destroys_its_entities():
+    mover = Mover()
+    parent, child = nested(mover)
+    parent.destroy(child)
+    parent.update(0)
+    assert mover.destroyed
+    assert child not in parent._entities
+    assert child.parent is None
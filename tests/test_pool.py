@@ -0,0 +1,99 @@
+from dalgi.entity_group import EntityGroup
+from dalgi.pool import EntityPool
+
+class Particle:
+    def __init__(self):
+        self.x = None
+        self.active = False
+        self.updates = 0
+
+    def reset(self, x):
+        self.x = x
+
+    def activate(self):
+        self.active = True
+
+    def deactivate(self):
+        self.active = False
+
+    def update(self, delta_time):
+        self.updates += 1
+
+class Expiring(Particle):
+    """Releases itself twice on its first update."""
+    pool = None
+
+    def update(self, delta_time):
+        super().update(delta_time)
+        self.pool.release(self)
+        self.pool.release(self)
+
+def test_released_entities_are_reused():
+    pool = EntityPool(Particle, size=2)
+    first = pool.spawn(1)
+    second = pool.spawn(2)
+    assert (first.x, second.x) == (1, 2)
+    assert first.active and second.active
+    pool.release(first)
+    assert not first.active
+    assert pool.spawn(3) is first
+    assert first.x == 3
+    stats = pool.stats()
+    assert stats["allocations"] == 0
+    assert stats["hit_rate"] == 1.0
+
+def test_full_pool_grows_or_refuses():
+    pool = EntityPool(Particle, size=1)
+    pool.spawn(0)
+    assert pool.spawn(1) is not None
+    assert pool.stats()["allocations"] == 1
+    fixed = EntityPool(Particle, size=1, grow=False)
+    fixed.spawn(0)
+    assert fixed.spawn(1) is None
+
+def test_only_active_entities_are_updated():
+    group = EntityGroup()
+    pool = group.create_pool(Particle, 4)
+    group.init()
+    particle = pool.spawn(0)
+    group.update(0)
+    assert particle.updates == 1
+    assert sum(p.updates for p in pool._entities) == 1
+
+def test_releasing_twice_is_ignored():
+    pool = EntityPool(Particle, size=2)
+    particle = pool.spawn(0)
+    pool.release(particle)
+    pool.release(particle)
+    assert pool.active_count == 0
+
+def test_releasing_twice_while_updating_is_ignored():
+    pool = EntityPool(Expiring, size=3)
+    for particle in pool._entities:
+        particle.pool = pool
+    kept = pool.spawn(0)
+    pool.spawn(1)
+    kept.update = lambda delta_time: None
+    pool.update(0)
+    assert pool.active_count == 1
+    assert pool.active == [kept]
+
+def test_pool_of_entities_without_draw_is_drawn_as_nothing():
+    from dalgi.headless import HeadlessRenderer
+    group = EntityGroup()
+    pool = group.create_pool(Particle, 0)
+    group.init()
+    particle = pool.spawn(1)
+    group.update(0)
+    group.draw(HeadlessRenderer())
+    assert particle.updates == 1
+
+def test_pool_of_entities_without_update_is_not_updated():
+    class Spark:
+        def draw(self, renderer, ox, oy):
+            pass
+    pool = EntityPool(Spark, size=1)
+    pool.spawn()
+    pool.update(0)
+    pool.interpolate(0.5)
+    pool.draw(None, 0, 0)
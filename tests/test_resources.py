@@ -0,0 +1,94 @@
+import pytest
+
+pytest.importorskip("sdl2")
+
+from dalgi.headless import HeadlessRenderer, COPY_EX, COMMAND_SIZE
+from dalgi.resources import Resources
+
+def copies(renderer):
+    commands = renderer.commands
+    return [
+        (commands[i + 1], commands[i + 2])
+        for i in range(0, len(commands), COMMAND_SIZE)
+        if commands[i] == COPY_EX
+    ]
+
+def test_sprites_are_drawn_in_call_order():
+    renderer = HeadlessRenderer()
+    resources = Resources(renderer)
+    resources.declare_sprite("one", "one.png", None)
+    resources.declare_sprite("two", "two.png", None)
+    one = resources.draw_function("one")
+    two = resources.draw_function("two")
+    one(0, 0)
+    one(1, 0)
+    two(2, 0)
+    one(3, 0)
+    assert copies(renderer) == [(1, 0), (1, 1), (2, 2), (1, 3)]
+
+TEXTURE_BYTES = 32 * 32 * 4
+
+def write_pack(directory, name, images):
+    path = str(directory / (name + ".toml"))
+    with open(path, "w") as f:
+        f.write('name = "{}"\n[simple]\n'.format(name))
+        for image in images:
+            f.write('{0} = "{0}.png"\n'.format(image))
+    return path
+
+@pytest.fixture
+def packs(tmp_path):
+    pytest.importorskip("ftoml")
+    return (
+        write_pack(tmp_path, "first", ["a", "b"]),
+        write_pack(tmp_path, "second", ["c"]),
+    )
+
+def test_textures_without_owner_are_never_evicted():
+    renderer = HeadlessRenderer()
+    resources = Resources(renderer, budget=0)
+    resources.declare_sprite("one", "one.png", None)
+    resources.declare_sprite("two", "two.png", None)
+    resources.draw_function("one")(0, 0)
+    resources.budget = 0
+    stats = resources.cache_stats()
+    assert stats["textures"] == 2
+    assert stats["evictions"] == 0
+
+def test_released_textures_are_evicted_over_budget(packs):
+    first, second = packs
+    renderer = HeadlessRenderer()
+    resources = Resources(renderer, budget=2 * TEXTURE_BYTES)
+    resources.load(first, owner="level 1")
+    resources.load(second, owner="level 2")
+    # Every texture is still referenced, so none is evicted
+    assert resources.cache_stats()["textures"] == 3
+    resources.release("level 1")
+    stats = resources.cache_stats()
+    assert stats["textures"] == 2
+    assert stats["evictions"] == 1
+    assert stats["resident_bytes"] == 2 * TEXTURE_BYTES
+
+def test_evicted_textures_are_loaded_again_when_drawn(packs):
+    first, _ = packs
+    renderer = HeadlessRenderer(keep_frames=True)
+    resources = Resources(renderer)
+    resources.load(first, owner="level")
+    draw = resources.draw_function("first/a")
+    resources.release("level")
+    resources.budget = 0
+    assert resources.cache_stats()["textures"] == 0
+    draw(5, 5)
+    assert resources.cache_stats()["reloads"] == 1
+    # The reloaded texture is the one drawn
+    assert copies(renderer) == [(renderer.textures_created, 5)]
+
+def test_reacquired_textures_are_not_evicted(packs):
+    first, _ = packs
+    renderer = HeadlessRenderer()
+    resources = Resources(renderer, budget=TEXTURE_BYTES * 2)
+    resources.load(first, owner="level")
+    resources.release("level")
+    resources.load(first, owner="level again")
+    resources.budget = 0
+    assert resources.cache_stats()["evictions"] == 0
@@ -0,0 +1,68 @@
+import gc
+from dalgi.scheduler import FrameScheduler
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def scheduler_with_clock():
+    scheduler = FrameScheduler(frame_time=0.01, margin=0.0)
+    clock = scheduler.clock = FakeClock()
+    return scheduler, clock
+
+def test_time_left_counts_down_from_the_frame_start():
+    scheduler, clock = scheduler_with_clock()
+    assert scheduler.time_left() == 0.01
+    clock.now = 1.0
+    scheduler.begin_frame()
+    clock.now = 1.004
+    assert abs(scheduler.time_left() - 0.006) < 1e-9
+    clock.now = 1.02
+    assert scheduler.time_left() < 0
+
+def test_slow_frames_are_counted_as_hitches():
+    scheduler, clock = scheduler_with_clock()
+    for duration in (0.01, 0.03, 0.01):
+        scheduler.begin_frame()
+        clock.now += duration
+    scheduler.begin_frame()
+    report = scheduler.report()
+    assert report["uncontrolled"] == {"frames": 3, "hitches": 1}
+
+def test_idle_tasks_take_turns_until_the_deadline():
+    scheduler, clock = scheduler_with_clock()
+    calls = []
+    def task(name):
+        def run():
+            calls.append(name)
+            clock.now += 0.004
+        return run
+    scheduler.add_idle_task(task("a"))
+    scheduler.add_idle_task(task("b"))
+    scheduler.add_idle_task(task("c"))
+    scheduler.begin_frame()
+    scheduler.run_idle()
+    # The cost of a task is unknown until it first runs
+    assert calls == ["a", "b", "c"]
+    del calls[:]
+    scheduler.begin_frame()
+    scheduler.run_idle()
+    # Each task takes 4ms of the 10ms frame, so only two of them fit
+    assert calls == ["a", "b"]
+    del calls[:]
+    scheduler.begin_frame()
+    scheduler.run_idle()
+    assert calls == ["c", "a"]
+
+def test_controlling_the_gc_is_undone_by_release():
+    thresholds = gc.get_threshold()
+    scheduler = FrameScheduler()
+    scheduler.control_gc()
+    try:
+        assert gc.get_threshold()[2] > thresholds[2]
+    finally:
+        scheduler.release_gc()
+    assert gc.get_threshold() == thresholds
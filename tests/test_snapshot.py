@@ -0,0 +1,137 @@
+import pickle
+
+import pytest
+from dalgi import snapshot
+from dalgi.entity_group import EntityGroup
+from dalgi.headless import HeadlessRenderer
+
+class Ship:
+    def __init__(self, x):
+        self.x = x
+        self.hits = 0
+        self.group = None
+
+    def init(self, group):
+        self.group = group
+        group.connect(self, "hit", self.on_hit)
+
+    def on_hit(self):
+        self.hits += 1
+
+class Camera:
+    def __init__(self, renderer):
+        self.renderer = renderer
+        self.zoom = 2
+
+class Marker:
+    def __init__(self, x):
+        self.x = x
+
+    def update(self, delta_time):
+        pass
+
+    def draw(self, renderer, ox, oy):
+        pass
+
+snapshot.register(Ship, "test_snapshot.Ship")
+snapshot.register(Marker, "test_snapshot.Marker")
+snapshot.register(Camera, "test_snapshot.Camera")
+
+def make_group():
+    group = EntityGroup()
+    group.register_messages("hit")
+    ships = [Ship(i) for i in range(3)]
+    group.add(ships[0])
+    group.add(ships[1], 3)
+    group.add(ships[2], 5)
+    group.add_tags(ships[1], "enemy")
+    group.init()
+    return group, ships
+
+def state(group):
+    return sorted(
+        (entity.x, record.layer, tuple(group.tags_of(entity)))
+        for entity, record in group._entities.items()
+    )
+
+def test_round_trip_keeps_layers_and_tags():
+    group, ships = make_group()
+    data = group.save_snapshot()
+    expected = state(group)
+
+    restored = EntityGroup()
+    restored.init()
+    restored.restore_snapshot(data)
+    assert state(restored) == expected
+    assert not set(restored._entities) & set(ships)
+
+def test_deltas_are_applied_in_order():
+    group, ships = make_group()
+    full = group.save_snapshot()
+    ships[0].x = 10
+    group.remove(ships[2])
+    group.update(0)
+    first = group.save_snapshot(delta=True)
+    group.add_tags(ships[0], "enemy")
+    second = group.save_snapshot(delta=True)
+    expected = state(group)
+
+    _, _, _, (_, changed, removed) = snapshot.read(first)
+    assert len(changed) == 1 and len(removed) == 1
+
+    restored = EntityGroup()
+    restored.init()
+    restored.restore_snapshot(full, first, second)
+    assert state(restored) == expected
+    with pytest.raises(ValueError):
+        restored.restore_snapshot(full, second)
+
+def test_deltas_notice_attributes_changed_in_place():
+    group, ships = make_group()
+    ships[1].path = [(0, 0)]
+    full = group.save_snapshot()
+    ships[1].path.append((5, 5))
+    delta = group.save_snapshot(delta=True)
+    _, _, _, (_, changed, _) = snapshot.read(delta)
+    assert len(changed) == 1
+
+    restored = EntityGroup()
+    restored.init()
+    restored.restore_snapshot(full, delta)
+    paths = [getattr(e, "path", None) for e in restored._entities]
+    assert [(0, 0), (5, 5)] in paths
+
+def test_delta_needs_a_previous_snapshot():
+    group, _ = make_group()
+    with pytest.raises(ValueError):
+        group.save_snapshot(delta=True)
+    with pytest.raises(ValueError):
+        group.restore_snapshot(group.save_snapshot(), group.save_snapshot())
+
+def test_default_hook_does_not_save_group_or_renderer():
+    group, ships = make_group()
+    group.add(Camera(HeadlessRenderer()))
+    group.update(0)
+    _, _, _, (_, changed, _) = snapshot.read(group.save_snapshot())
+    states = {name: pickle.loads(state) for _, name, _, _, state in changed}
+    assert states["test_snapshot.Ship"]["group"] is None
+    assert states["test_snapshot.Camera"] == {"renderer": None, "zoom": 2}
+
+def test_restored_entities_connect_again_in_init():
+    group, ships = make_group()
+    data = group.save_snapshot()
+    group.restore_snapshot(data)
+    restored = list(group._entities)
+    assert all(ship.group is group for ship in restored)
+    group.send_message("hit")
+    assert [ship.hits for ship in restored] == [1, 1, 1]
+    assert [ship.hits for ship in ships] == [0, 0, 0]
+
+def test_restore_keeps_order_across_layers():
+    group = EntityGroup()
+    for x, layer in enumerate([2, 1, 2, 3, 1]):
+        group.add(Marker(x), layer)
+    group.init()
+    group.restore_snapshot(group.save_snapshot())
+    assert [marker.x for marker in group._listeners["update"]] == [0, 1, 2, 3, 4]
+    assert [group._entities[m].layer for m in group._listeners["update"]] == [2, 1, 2, 3, 1]
@@ -0,0 +1,109 @@
+from dalgi.entity_group import EntityGroup
+from dalgi.headless import HeadlessRenderer
+from dalgi.spatial_index import SpatialGrid
+
+def test_grid_queries_follow_moves_across_cells():
+    grid = SpatialGrid(cell_size=10)
+    grid.insert("a", (0, 0, 5, 5))
+    grid.insert("b", (8, 8, 15, 15)) # Spans four cells
+    assert set(grid.query_point(2, 2)) == {"a"}
+    assert set(grid.query_point(20, 20)) == {"b"}
+    assert set(grid.query_rect(0, 0, 9, 9)) == {"a", "b"}
+    assert grid.query_point(6, 6) == {}
+
+    grid.move("a", (30, 30, 5, 5))
+    assert grid.query_point(2, 2) == {}
+    assert grid.query_point(31, 31) == {"a": (30, 30, 5, 5)}
+    assert set(grid.query_rect(25, 25, 10, 10)) == {"a"}
+
+    grid.remove("b")
+    assert "b" not in grid
+    assert grid.query_rect(0, 0, 25, 25) == {}
+    assert len(grid) == 1
+
+class Button:
+    def __init__(self, x, y, size=10):
+        self.x = x
+        self.y = y
+        self.size = size
+        self.presses = []
+        self.draws = 0
+
+    def bounds(self):
+        return (self.x, self.y, self.size, self.size)
+
+    def draw(self, renderer, ox, oy):
+        self.draws += 1
+
+    def mouse_pressed(self, sx, sy, x, y, button, is_touch):
+        self.presses.append((x, y))
+
+class Background:
+    def __init__(self):
+        self.presses = []
+
+    def mouse_pressed(self, sx, sy, x, y, button, is_touch):
+        self.presses.append((x, y))
+
+def press(group, x, y):
+    group.mouse_pressed(x, y, x, y, 1, False)
+
+def pointer_group():
+    group = EntityGroup()
+    buttons = [Button(0, 0), Button(100, 0), Button(200, 200)]
+    background = Background()
+    group.add_many(buttons)
+    group.add(background)
+    group.enable_spatial_index(cell_size=64)
+    group.init()
+    return group, buttons, background
+
+def test_presses_only_reach_listeners_under_the_cursor():
+    group, buttons, background = pointer_group()
+    press(group, 105, 5)
+    assert [b.presses for b in buttons] == [[], [(105, 5)], []]
+    assert background.presses == [(105, 5)]
+    assert list(group.find_all_at(5, 5)) == [buttons[0]]
+
+def test_moved_entities_are_found_at_their_new_bounds():
+    group, buttons, _ = pointer_group()
+    buttons[0].x = 300
+    group.moved(buttons[0])
+    press(group, 5, 5)
+    press(group, 305, 5)
+    assert buttons[0].presses == [(305, 5)]
+    assert list(group.find_all_at(5, 5)) == []
+
+def test_capturing_entity_receives_presses_outside_its_bounds():
+    group, buttons, background = pointer_group()
+    group.capture_mouse(buttons[2])
+    press(group, 5, 5)
+    assert buttons[0].presses == [(5, 5)]
+    assert buttons[1].presses == []
+    assert buttons[2].presses == [(5, 5)]
+    group.release_mouse(buttons[2])
+    press(group, 6, 6)
+    assert buttons[2].presses == [(5, 5)]
+
+def culling_group(indexed):
+    group = EntityGroup()
+    buttons = [Button(x * 50, 0) for x in range(10)]
+    group.add_many(buttons)
+    if indexed:
+        group.enable_spatial_index()
+    group.init()
+    group.viewport = (0, 0, 120, 100)
+    return group, buttons
+
+def test_viewport_culls_indexed_entities():
+    group, buttons = culling_group(indexed=True)
+    group.draw(HeadlessRenderer())
+    assert (group.drawn_count, group.culled_count) == (3, 7)
+    assert [b.draws for b in buttons[:4]] == [1, 1, 1, 0]
+
+def test_viewport_culls_by_bounds_without_index():
+    group, buttons = culling_group(indexed=False)
+    group.x = -45
+    group.draw(HeadlessRenderer())
+    assert (group.drawn_count, group.culled_count) == (3, 7)
+    assert [b.draws for b in buttons[:5]] == [0, 1, 1, 1, 0]
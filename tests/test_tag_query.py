@@ -0,0 +1,53 @@
+import pytest
+from dalgi.entity_group import EntityGroup
+
+class Thing:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+@pytest.fixture
+def scene():
+    group = EntityGroup()
+    things = {name: Thing(name) for name in ("a", "b", "c", "d")}
+    group.add_many(things.values())
+    group.add_tags(things["a"], "enemy", "visible")
+    group.add_tags(things["b"], "enemy", "visible", "stunned")
+    group.add_tags(things["c"], "enemy")
+    group.add_tags(things["d"], "visible")
+    group.init()
+    return group, things
+
+def test_query_matches_required_and_excluded_tags(scene):
+    group, things = scene
+    query = group.query("enemy", "visible", exclude=["stunned"])
+    assert list(query) == [things["a"]]
+    assert list(group.query("enemy")) == [things["a"], things["b"], things["c"]]
+    assert things["d"] in group.query("visible")
+
+def test_queries_are_compiled_once(scene):
+    group, _ = scene
+    assert group.query("enemy", "visible") is group.query("visible", "enemy")
+
+def test_results_follow_tag_changes_and_removals(scene):
+    group, things = scene
+    query = group.query("enemy", "visible", exclude=["stunned"])
+    results = query.results
+    group.remove_tags(things["b"], "stunned")
+    group.add_tags(things["c"], "visible")
+    group.add_tags(things["a"], "stunned")
+    group.update(0)
+    assert list(results) == [things["b"], things["c"]]
+    group.remove(things["b"])
+    group.update(0)
+    assert list(results) == [things["c"]]
+    assert query.results is results
+
+def test_results_are_read_only(scene):
+    group, things = scene
+    results = group.find_all_with_tag("enemy")
+    with pytest.raises(TypeError):
+        results[things["d"]] = None
+    assert group.tags_of(things["b"]) == ["enemy", "visible", "stunned"]
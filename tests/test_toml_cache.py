@@ -0,0 +1,46 @@
+import os
+import pickle
+import pytest
+
+pytest.importorskip("ftoml")
+
+from dalgi import toml_cache
+
+@pytest.fixture
+def level(tmp_path):
+    path = str(tmp_path / "level.toml")
+    with open(path, "w") as f:
+        f.write('name = "level"\nsize = [3, 4]\n')
+    toml_cache.reset_cache_stats()
+    return path
+
+def test_unchanged_file_is_read_from_the_cache(level):
+    data = toml_cache.load_toml(level)
+    assert toml_cache.load_toml(level) == data == {"name": "level", "size": [3, 4]}
+    stats = toml_cache.cache_stats()
+    assert (stats["misses"], stats["hits"]) == (1, 1)
+
+def test_truncated_cache_is_a_miss(level):
+    data = toml_cache.load_toml(level)
+    cache = toml_cache.cache_path(level)
+    with open(cache, "rb+") as f:
+        pickle.load(f)
+        f.truncate(f.tell() + 2)
+    assert toml_cache.load_toml(level) == data
+    assert toml_cache.cache_stats()["misses"] == 2
+    # The damaged cache was replaced
+    assert toml_cache.load_toml(level) == data
+    assert toml_cache.cache_stats()["hits"] == 1
+
+def test_malformed_header_is_a_miss(level):
+    with open(toml_cache.cache_path(level), "wb") as f:
+        pickle.dump((toml_cache.CACHE_VERSION, 1), f)
+    assert toml_cache.load_toml(level) == {"name": "level", "size": [3, 4]}
+    assert toml_cache.cache_stats()["misses"] == 1
+
+def test_touched_file_with_same_content_is_a_hit(level):
+    data = toml_cache.load_toml(level)
+    stat = os.stat(level)
+    os.utime(level, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert toml_cache.load_toml(level) == data
+    assert toml_cache.cache_stats()["hits"] == 1
@@ -0,0 +1,144 @@
+"""Caches parsed TOML files in pickled sidecar files next to them.
+Run 'python -m dalgi.toml_cache DIRECTORY...' to build the caches of every
+TOML file in the given directories ahead of time."""
+import hashlib
+import os
+import pickle
+import sys
+import time
+
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".cache"
+
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "parse_time": 0.0,
+    "load_time": 0.0,
+}
+
+def cache_stats() -> dict:
+    """Returns the number of cache hits and misses, and the seconds spent
+    parsing TOML and in 'load_toml' in total."""
+    return dict(_stats)
+
+def reset_cache_stats():
+    for key in _stats:
+        _stats[key] = type(_stats[key])()
+
+def cache_path(path: str) -> str:
+    return path + CACHE_SUFFIX
+
+def _read_cache(path: str):
+    """Returns the header and an open file positioned at the cached data, or
+    (None, None) if there is no readable cache."""
+    try:
+        f = open(cache_path(path), "rb")
+    except OSError:
+        return None, None
+    try:
+        header = pickle.load(f)
+        if header[0] == CACHE_VERSION:
+            return header, f
+    except Exception:
+        pass
+    f.close()
+    return None, None
+
+def _write_cache(path: str, header: tuple, data: dict):
+    # Write to a temporary file first, so readers never see a partial cache
+    temp_path = "{}.{}.tmp".format(cache_path(path), os.getpid())
+    try:
+        with open(temp_path, "wb") as f:
+            pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path(path))
+    except OSError:
+        # The cache is only an optimization, so read-only directories are fine
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+def load_toml(path: str, use_cache: bool = True) -> dict:
+    """Loads the TOML file at the given path.
+    The parsed data is cached next to the file, and reused as long as the
+    modification time and size of the file are unchanged, or its content
+    hash still matches."""
+    start = time.perf_counter()
+    try:
+        return _load_toml(path, use_cache)
+    finally:
+        _stats["load_time"] += time.perf_counter() - start
+
+def _load_toml(path: str, use_cache: bool) -> dict:
+    if not use_cache:
+        with open(path, "rb") as f:
+            return _parse(f.read())
+
+    stat = os.stat(path)
+    source = None
+    header, cache = _read_cache(path)
+    if cache is not None:
+        with cache:
+            try:
+                _, mtime, size, digest = header
+                if mtime == stat.st_mtime_ns and size == stat.st_size:
+                    data = pickle.load(cache)
+                    _stats["hits"] += 1
+                    return data
+
+                with open(path, "rb") as f:
+                    source = f.read()
+                if hashlib.sha1(source).digest() == digest:
+                    data = pickle.load(cache)
+                    _stats["hits"] += 1
+                    # Record the new modification time to skip hashing next time
+                    _write_cache(path, (CACHE_VERSION, stat.st_mtime_ns, stat.st_size, digest), data)
+                    return data
+            except Exception:
+                # A damaged cache is a miss, and is replaced below
+                pass
+    if source is None:
+        with open(path, "rb") as f:
+            source = f.read()
+
+    _stats["misses"] += 1
+    data = _parse(source)
+    digest = hashlib.sha1(source).digest()
+    _write_cache(path, (CACHE_VERSION, stat.st_mtime_ns, stat.st_size, digest), data)
+    return data
+
+def _parse(source: bytes) -> dict:
+    # The parser is only imported when a file is not cached
+    import ftoml as toml
+    start = time.perf_counter()
+    data = toml.loads(source.decode("utf-8"))
+    _stats["parse_time"] += time.perf_counter() - start
+    return data
+
+def build_caches(directory: str) -> int:
+    """Builds the caches of every TOML file in the directory and its
+    subdirectories. Returns the number of files that had to be parsed."""
+    misses = _stats["misses"]
+    for root, _, files in os.walk(directory):
+        for filename in files:
+            if filename.endswith(".toml"):
+                load_toml(os.path.join(root, filename))
+    return _stats["misses"] - misses
+
+def main(args):
+    if not args:
+        print("Usage: python -m dalgi.toml_cache DIRECTORY...")
+        return 1
+    for directory in args:
+        parsed = build_caches(directory)
+        print("{}: {} file(s) parsed".format(directory, parsed))
+    stats = cache_stats()
+    print("{} hit(s), {} miss(es), {:.3f}s parsing".format(
+        stats["hits"], stats["misses"], stats["parse_time"]
+    ))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
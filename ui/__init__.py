@@ -1,7 +1,21 @@
-from .label import Label
-from .primitive import ColorRect
-from .circle_scroller import CircleScroller
+import importlib
 
-del label
-del primitive
-del circle_scroller
\ No newline at end of file
+# {name: submodule}, imported when the name is first used
+_LAZY = {
+    "Label": "label",
+    "ColorRect": "primitive",
+    "CircleScroller": "circle_scroller",
+}
+
+__all__ = list(_LAZY)
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module("." + module, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
@@ -1,4 +1,5 @@
 from sdl2 import Rect
+from ..display_list import FILL
 import math
 
 class CircleScroller:
@@ -18,12 +19,27 @@ class CircleScroller:
         self.activated = False
         self.angle_callback = angle_callback
         self.crect = Rect.from_center(self.rect.center(), (10, 10))
+        self.group = None
+        self.revision = 0
+    
+    def init(self, group):
+        self.group = group
+    
+    def bounds(self):
+        return (self.rect.x, self.rect.y, self.rect.w, self.rect.h)
     
     def mouse_pressed(self, sx, sy, x, y, button, is_touch):
         if self.rect.contains(x, y):
             self.activated = not self.activated
+            self.revision += 1
             if not self.activated:
                 self.angle_callback(None)
+            # Keep receiving mouse motion outside of the scroller while active
+            if self.group is not None:
+                if self.activated:
+                    self.group.capture_mouse(self)
+                else:
+                    self.group.release_mouse(self)
         
     def angle(self, x, y):
         """Returns the angle between the center of the scroller and the
@@ -47,7 +63,11 @@ class CircleScroller:
         angle = self.angle(x, y)
         self.angle_callback(angle)
         
+    def display_commands(self):
+        area_color = self.AREA_ACTIVE_COLOR if self.activated else self.AREA_INACTIVE_COLOR
+        return [(FILL, area_color, None, self.rect), (FILL, self.CENTER_COLOR, None, self.crect)]
+    
     def draw(self, renderer, ox, oy):
         area_color = self.AREA_ACTIVE_COLOR if self.activated else self.AREA_INACTIVE_COLOR
         renderer.c_fill_rect(area_color, self.rect.moved_by(ox, oy))
-        renderer.c_fill_rect(self.CENTER_COLOR, self.crect)
+        renderer.c_fill_rect(self.CENTER_COLOR, self.crect.moved_by(ox, oy))
@@ -1,7 +1,21 @@
+import weakref
+
+from .text_cache import line_cache, glyph_atlas as shared_glyph_atlas
+
+def _release_lines(cached_lines: list):
+    for key in cached_lines:
+        line_cache.release(*key)
+    cached_lines.clear()
 
 class Label:
-    """A widget to show text on the screen"""
-    def __init__(self, x, y, text, font, renderer, color=(0, 0, 0)):
+    """A widget to show text on the screen.
+    Lines are rendered through a shared cache, so repeated text is only
+    rendered once. With 'glyph_atlas' set, the text is instead composed from
+    the glyphs of a shared atlas texture, which suits text that changes
+    every frame, and falls back to the cache when its glyphs do not fit in
+    the atlas. Cached lines are released by 'destroy', or when the label is
+    garbage collected."""
+    def __init__(self, x, y, text, font, renderer, color=(0, 0, 0), glyph_atlas=False):
         self.x = x
         self.y = y
         self._color = color
@@ -9,23 +23,68 @@ class Label:
         self.renderer = renderer
         self._font = font
         self.textures = []
+        self.use_glyph_atlas = glyph_atlas
+        self._atlas = None
+        self._atlas_generation = 0
+        self._layouts = [] # [(width, quads)] when using the glyph atlas
+        self._cached_lines = [] # [(renderer, font, color, line)] acquired from the cache
+        self._finalizer = weakref.finalize(self, _release_lines, self._cached_lines)
+        # Textures are freed with the renderer at exit
+        self._finalizer.atexit = False
         self.dirty = True
+        self.revision = 0
     
-    def redraw(self):
+    def _release(self):
+        _release_lines(self._cached_lines)
         self.textures.clear()
-        for line in self._text.splitlines():
-            surf = self._font.render_blended(line, self._color)
-            tex = self.renderer.create_texture_from_surface(surf)
-            self.textures.append(tex)
+        self._layouts = []
+    
+    def redraw(self):
+        self._release()
+        lines = self._text.splitlines()
+        self._atlas = None
+        if self.use_glyph_atlas:
+            atlas = shared_glyph_atlas(self.renderer, self._font, self._color)
+            try:
+                self._layouts = [atlas.layout(line) for line in lines]
+                self._atlas = atlas
+                self._atlas_generation = atlas.generation
+            except ValueError:
+                # Too many different glyphs, such as in CJK text
+                self._layouts = []
+        if self._atlas is None:
+            for line in lines:
+                tex = line_cache.acquire(self.renderer, self._font, self._color, line)
+                self._cached_lines.append((self.renderer, self._font, self._color, line))
+                self.textures.append(tex)
         
         self.dirty = False
     
-    def draw(self, renderer, ox, oy):
+    def destroy(self):
+        """Releases the textures of the label."""
+        self._release()
+        self.dirty = True
+    
+    def bounds(self):
         if self.dirty:
             self.redraw()
+        if self._atlas is not None:
+            widths = [width for width, _ in self._layouts]
+        else:
+            widths = [texture.width for texture in self.textures]
+        return (self.x, self.y, max(widths, default=0), len(widths) * self._font.line_skip())
+    
+    def draw(self, renderer, ox, oy):
+        if self.dirty or (self._atlas is not None and self._atlas.generation != self._atlas_generation):
+            self.redraw()
         x = self.x + ox
         y = self.y + oy
         ls = self._font.line_skip()
+        if self._atlas is not None:
+            for _, quads in self._layouts:
+                self._atlas.draw(renderer, quads, x, y)
+                y += ls
+            return
         for texture in self.textures:
             renderer.copy(texture, dst_rect=texture.rect_at(x, y))
             y += ls
@@ -40,6 +99,7 @@ class Label:
         if value != self._font:
             self._font = value
             self.dirty = True
+            self.revision += 1
     
     @property
     def text(self):
@@ -51,6 +111,7 @@ class Label:
         if value != self._text:
             self._text = value
             self.dirty = True
+            self.revision += 1
     
     @property
     def color(self):
@@ -62,3 +123,4 @@ class Label:
         if value != self._color:
             self._color = value
             self.dirty = True
+            self.revision += 1
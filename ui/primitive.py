@@ -1,8 +1,28 @@
+from ..display_list import FILL
+
 class ColorRect:
     """A simple colored rectangle."""
     def __init__(self, color, rect):
         self.rect = rect
-        self.color = color
+        self._color = color
+        self.revision = 0
+    
+    @property
+    def color(self):
+        """The color of this rectangle. Set to update."""
+        return self._color
+    
+    @color.setter
+    def color(self, value):
+        if value != self._color:
+            self._color = value
+            self.revision += 1
+    
+    def bounds(self):
+        return (self.rect.x, self.rect.y, self.rect.w, self.rect.h)
+    
+    def display_commands(self):
+        return [(FILL, self._color, None, self.rect)]
     
     def draw(self, renderer, ox, oy):
         renderer.c_fill_rect(self.color, self.rect.moved_by(ox, oy))
@@ -0,0 +1,140 @@
+from collections import OrderedDict
+from sdl2 import Rect, Surface
+from ..atlas import ShelfPacker
+
+class LineTextureCache:
+    """A shared cache of rendered text lines, keyed by font, color and text.
+    Textures in use are pinned, and unused ones are kept until the cache
+    grows beyond 'max_bytes', after which the least recently used ones are
+    destroyed."""
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = {} # {key: [texture, users, size]}
+        self._unused = OrderedDict() # {key: None}, least recently used first
+
+    def acquire(self, renderer, font, color, line: str):
+        """Returns a texture of the rendered line, which must be released
+        when no longer drawn."""
+        key = (renderer, font, color, line)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            surf = font.render_blended(line, color)
+            texture = renderer.create_texture_from_surface(surf)
+            entry = [texture, 0, texture.width * texture.height * 4]
+            self._entries[key] = entry
+            self.bytes += entry[2]
+        else:
+            self.hits += 1
+            self._unused.pop(key, None)
+        entry[1] += 1
+        return entry[0]
+
+    def release(self, renderer, font, color, line: str):
+        key = (renderer, font, color, line)
+        entry = self._entries[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            self._unused[key] = None
+            self.evict()
+
+    def evict(self):
+        """Destroys unused textures until the cache fits in its budget."""
+        while self.bytes > self.max_bytes and self._unused:
+            key, _ = self._unused.popitem(last=False)
+            texture, _, size = self._entries.pop(key)
+            texture.destroy()
+            self.bytes -= size
+
+line_cache = LineTextureCache()
+
+class GlyphAtlas:
+    """The glyphs of a font in one color, rendered into a single texture, so
+    that changing text can be drawn without rendering or creating textures.
+    Glyphs are added the first time they are used. Laying out glyphs which
+    do not fit in the atlas raises ValueError."""
+    PRELOADED = "".join(chr(c) for c in range(32, 127))
+
+    def __init__(self, renderer, font, color, page_size: int = 1024):
+        self.renderer = renderer
+        self.font = font
+        self.color = color
+        self.page_size = page_size
+        self.texture = None
+        self.generation = 0 # Increased when the glyphs are moved
+        self._glyphs = {} # {char: source Rect}
+        self._kerning = {} # {(char, char): pixels}
+        self._unfit = set() # Chars which did not fit, so they are not rendered again
+        self._build(self.PRELOADED)
+
+    def _build(self, chars: str):
+        """Renders the given glyphs along with the existing ones into a new
+        texture, and destroys the old one."""
+        chars = "".join(dict.fromkeys(list(self._glyphs) + list(chars)))
+        surfaces = [self.font.render_blended(c, self.color) for c in chars]
+        packer = ShelfPacker(self.page_size)
+        placements = packer.pack([(s.width, s.height) for s in surfaces])
+        if len(packer.pages) > 1:
+            raise ValueError("The glyphs do not fit in a {} pixel atlas".format(self.page_size))
+        width, height = packer.page_sizes()[0]
+        page = Surface.blank(width, height)
+        glyphs = {}
+        for char, surface, (_, x, y) in zip(chars, surfaces, placements):
+            glyphs[char] = Rect(x, y, surface.width, surface.height)
+            page.blit(surface, glyphs[char])
+        if self.texture is not None:
+            self.texture.destroy()
+        self.texture = self.renderer.create_texture_from_surface(page)
+        self._glyphs = glyphs
+        self.generation += 1
+
+    def _kern(self, a: str, b: str) -> int:
+        pair = (a, b)
+        kerning = self._kerning.get(pair)
+        if kerning is None:
+            width, _ = self.font.size(a + b)
+            kerning = width - self._glyphs[a].w - self._glyphs[b].w
+            self._kerning[pair] = kerning
+        return kerning
+
+    def layout(self, line: str) -> tuple:
+        """Returns the (width, [(source rect, destination rect)]) of the
+        glyphs of the line, relative to its top left corner."""
+        missing = [c for c in line if c not in self._glyphs]
+        if missing:
+            if not self._unfit.isdisjoint(missing):
+                raise ValueError("The glyphs do not fit in a {} pixel atlas".format(self.page_size))
+            try:
+                self._build("".join(missing))
+            except ValueError:
+                self._unfit.update(missing)
+                raise
+        quads = []
+        x = 0
+        prev = None
+        for char in line:
+            src = self._glyphs[char]
+            if prev is not None:
+                x += self._kern(prev, char)
+            quads.append((src, Rect(x, 0, src.w, src.h)))
+            x += src.w
+            prev = char
+        return (x, quads)
+
+    def draw(self, renderer, quads: list, x: int, y: int):
+        texture = self.texture
+        for src, dst in quads:
+            renderer.copy(texture, src_rect=src, dst_rect=dst.moved_by(x, y))
+
+_glyph_atlases = {} # {(renderer, font, color): GlyphAtlas}
+
+def glyph_atlas(renderer, font, color) -> GlyphAtlas:
+    """Returns the shared glyph atlas of the font in the given color."""
+    key = (renderer, font, color)
+    atlas = _glyph_atlases.get(key)
+    if atlas is None:
+        atlas = _glyph_atlases[key] = GlyphAtlas(renderer, font, color)
+    return atlas
@@ -1,49 +1,204 @@
+import asyncio
 import time
 from sdl2 import init_everything, Renderer, Window
-from dalgi import EntityGroup
-from typing import Callable, Union
+from dalgi import EntityGroup, FramerateLimiter
+from dalgi.scheduler import FrameScheduler
+from typing import Callable, Optional, Union
 
 Number = Union[float, int]
 
 def run_simple_main_loop(setup_function: Callable[[Window, Renderer, EntityGroup], None],
-        title: str="Dalgi", frame_sleep_time: Number=0.001):
+        title: str="Dalgi", frame_sleep_time: Number=0.001,
+        scheduler: Optional[FrameScheduler]=None, coalesce_events: bool=False):
     """Starts a simple dalgi SDL2 main loop after running the setup function.
     The function should have the following signature:
-    setup_function(window, renderer, entity_group)"""
+    setup_function(window, renderer, entity_group)
+    With a scheduler, the time left of each frame is given to it for
+    garbage collection and idle tasks before sleeping.
+    With 'coalesce_events' set, the mouse motions and wheel events of a frame
+    are merged as described in 'EntityGroup.handle_events'."""
     """Entry point"""
     with init_everything() as context:
-        window = context.build_window().title(title).finish()
-        renderer = window.build_renderer().finish()
-        renderer.set_clear_color(255, 255, 255)
-        group = EntityGroup()
-        context.set_quit_handler(lambda: group.quit())
-        
-        setup_function(window, renderer, group)
-        
-        group.validate_message_connections()
-        group.init()
+        window, renderer, group = _set_up(context, setup_function, title)
         last_frame = time.perf_counter()
-        running = True
-        while running:
+        while not group.quit_requested:
+            profiler = group.profiler
+            if scheduler is not None:
+                scheduler.begin_frame()
+            
             # handle events
-            for event in context.get_events():
-                group.handle(event)
+            start = time.perf_counter()
+            group.handle_events(context.get_events(), coalesce_events)
+            if profiler is not None:
+                profiler.record("events", start)
                 
             # update
             now = time.perf_counter()
             delta_time = now - last_frame
             last_frame = now
             group.update(delta_time)
-            #print("Deltatime: {}".format(delta_time))
             
-            # render
-            renderer.clear()
-            group.draw(renderer)
+            _render(renderer, group)
             
-            renderer.present()
+            if scheduler is not None:
+                _run_idle(scheduler, group)
             
             # act nice
+            start = time.perf_counter()
             time.sleep(frame_sleep_time)
+            if profiler is not None:
+                profiler.record("sleep", start)
+
+def run_fixed_step_main_loop(setup_function: Callable[[Window, Renderer, EntityGroup], None],
+        title: str="Dalgi", update_rate: Number=60, max_fps: Number=60,
+        max_steps: int=5, interpolate: bool=False,
+        scheduler: Optional[FrameScheduler]=None, coalesce_events: bool=False):
+    """Starts a dalgi SDL2 main loop which updates the group with a fixed
+    timestep of 1/update_rate seconds, and renders at most max_fps frames per
+    second. At most max_steps updates are run per frame, after which the
+    simulation falls behind instead of spending ever longer catching up.
+    With 'interpolate' set, the group is sent how far the time has come
+    towards the next update before each frame is drawn.
+    With a scheduler, the time left before the next frame is given to it for
+    garbage collection and idle tasks.
+    The setup function and 'coalesce_events' are the same as for
+    'run_simple_main_loop'."""
+    with init_everything() as context:
+        window, renderer, group = _set_up(context, setup_function, title)
+        step = 1.0 / update_rate
+        limiter = FramerateLimiter(max_fps)
+        accumulator = 0.0
+        last_frame = time.perf_counter()
+        limiter.reset()
+        while not group.quit_requested:
+            profiler = group.profiler
+            if scheduler is not None:
+                scheduler.begin_frame()
+            start = time.perf_counter()
+            group.handle_events(context.get_events(), coalesce_events)
+            if profiler is not None:
+                profiler.record("events", start)
+            
+            now = time.perf_counter()
+            accumulator += now - last_frame
+            last_frame = now
+            steps = 0
+            while accumulator >= step and steps < max_steps:
+                group.update(step)
+                accumulator -= step
+                steps += 1
+            if accumulator >= step:
+                accumulator %= step
+            
+            if interpolate:
+                group.interpolate(accumulator / step)
+            _render(renderer, group)
+            
+            if scheduler is not None:
+                _run_idle(scheduler, group, limiter.deadline - limiter.SPIN_TIME)
+            
+            start = time.perf_counter()
+            limiter.tick()
+            if profiler is not None:
+                profiler.record("sleep", start)
+
+async def run_async_main_loop(setup_function: Callable[[Window, Renderer, EntityGroup], None],
+        title: str="Dalgi", max_fps: Number=60, async_timeout: Optional[Number]=None,
+        scheduler: Optional[FrameScheduler]=None, coalesce_events: bool=False):
+    """Runs a dalgi SDL2 main loop as a coroutine, so that it shares its
+    thread with other asyncio code, and returns when the group has accepted
+    a request to quit.
+    Instead of sleeping, each frame waits on the event loop until its
+    deadline, which lets other tasks run. After the normal update, the
+    'async_update' coroutines of the entities are run concurrently, and are
+    waited for at most 'async_timeout' seconds each frame, which is half of
+    the frame time by default.
+    The setup function and 'coalesce_events' are the same as for
+    'run_simple_main_loop'."""
+    loop = asyncio.get_running_loop()
+    period = 1.0 / max_fps
+    if async_timeout is None:
+        async_timeout = period / 2
+    with init_everything() as context:
+        window, renderer, group = _set_up(context, setup_function, title)
+        last_frame = time.perf_counter()
+        deadline = loop.time()
+        try:
+            while not group.quit_requested:
+                profiler = group.profiler
+                if scheduler is not None:
+                    scheduler.begin_frame()
+                start = time.perf_counter()
+                group.handle_events(context.get_events(), coalesce_events)
+                if profiler is not None:
+                    profiler.record("events", start)
+                
+                now = time.perf_counter()
+                delta_time = now - last_frame
+                last_frame = now
+                group.update(delta_time)
+                start = time.perf_counter()
+                await group.async_update(delta_time, async_timeout)
+                if profiler is not None:
+                    profiler.record("async_update", start)
+                
+                _render(renderer, group)
+                
+                deadline += period
+                if deadline < loop.time():
+                    deadline = loop.time()
+                if scheduler is not None:
+                    _run_idle(scheduler, group, time.perf_counter() + deadline - loop.time())
+                
+                start = time.perf_counter()
+                await _wait_until(loop, deadline)
+                if profiler is not None:
+                    profiler.record("sleep", start)
+        finally:
+            await group.cancel_async_updates()
+
+async def _wait_until(loop, deadline):
+    """Lets the event loop run other tasks until the deadline."""
+    woken = loop.create_future()
+    handle = loop.call_at(deadline, _wake, woken)
+    try:
+        await woken
+    finally:
+        handle.cancel()
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+def _set_up(context, setup_function, title):
+    window = context.build_window().title(title).finish()
+    renderer = window.build_renderer().finish()
+    renderer.set_clear_color(255, 255, 255)
+    group = EntityGroup()
+    context.set_quit_handler(lambda: group.quit())
+    
+    setup_function(window, renderer, group)
+    
+    group.validate_message_connections()
+    group.init()
+    return window, renderer, group
+
+def _render(renderer, group):
+    # Groups with dirty rendering clear the frames they fully redraw, and
+    # only draw over the last frame when it is kept in a retained target
+    if not group.dirty_rendering:
+        renderer.clear()
+    if group.draw(renderer):
+        start = time.perf_counter()
+        renderer.present()
+        if group.profiler is not None:
+            group.profiler.record("present", start)
+
+def _run_idle(scheduler, group, deadline=None):
+    start = time.perf_counter()
+    scheduler.run_idle(deadline)
+    if group.profiler is not None:
+        group.profiler.record("idle", start)
 
 class Ref:
     """A simple object to wrap primitives when modifying them from closures."""